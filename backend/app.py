@@ -1,15 +1,30 @@
 import io
 import os
+import time
+import uuid
+import zipfile
+import hashlib
 import tempfile
-import json
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import pandas as pd
-from flask import Flask, request, render_template, session, send_file
-from apscheduler.schedulers.background import BackgroundScheduler
-from utils.validation import file_validation, parameter_validation
-from utils.analysis import data_processing, data_analysis
-from utils.plot import plot_all, plot_individual
-from utils.export import export_word
+from flask import Flask, request, render_template, session, send_file, jsonify, url_for, g, Response, stream_with_context
+from werkzeug.datastructures import FileStorage
+from utils.validation import file_validation, parameter_validation, parse_date_format
+from utils.analysis import RESAMPLE_PERIOD, data_processing, data_resampling, data_analysis
+from utils.plot import plot_all, plot_panels, individual_plots, preview_dpi
+from utils.export import export_word, export_summary
+from utils.storage import save_session, load_session, load_data
+from utils.cache import LRUCache, file_hash, cache_key
+from utils.figures import FigureCache
+from utils.pyramid import build_pyramid, level_of_detail, default_points
+from utils.tempstore import TempStore
+from utils.jobs import JobQueue
+from utils.live import LiveTests
+from utils.startup import warm_up, acquire_lock
+from utils import metrics
 
 app = Flask(__name__)
 app.secret_key = 'this_secret_key_is_secret'
@@ -21,22 +36,188 @@ if APP_ENV == 'local':
 else:
     TEMP_DIR = os.path.join('backend', 'tmp')
 
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 256))  # MB
+FIGURE_CACHE_SIZE = int(os.getenv('FIGURE_CACHE_SIZE', 64))  # MB
+FIGURE_DISK_SIZE = int(os.getenv('FIGURE_DISK_SIZE', 512))  # MB
+PYRAMID_CACHE_SIZE = int(os.getenv('PYRAMID_CACHE_SIZE', 64))  # MB
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+ANALYSIS_QUEUE_SIZE = int(os.getenv('ANALYSIS_QUEUE_SIZE', 8))  # queued + running jobs
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 4))
+TEMP_DIR_SIZE = int(os.getenv('TEMP_DIR_SIZE', 2048))  # MB
+SESSION_TTL = int(os.getenv('SESSION_TTL', 12))  # hours since the last access
+SCHEDULER = os.getenv('SCHEDULER', 'auto')  # auto: one process per TEMP_DIR, on: every process, off: none
+WARM_UP = os.getenv('WARM_UP', 'lazy')  # lazy: on first use, import: before serving, background: in a thread
+
+# session data, figures, queued uploads and profiles in TEMP_DIR, removed once unused for their TTL or when over quota
+temp_store = TempStore(TEMP_DIR, max_bytes=TEMP_DIR_SIZE * 1024**2, keep=['temporary_file', 'scheduler.lock'],
+                       ttls={'session': SESSION_TTL * 3600, 'figure': SESSION_TTL * 3600, 'upload': 6 * 3600,
+                             'profile': 7 * 86400, 'other': 86400})
+
+# parsed + resampled uploads and finished analyses, keyed by the upload hash and the validated parameters
+result_cache = LRUCache(max_bytes=RESULT_CACHE_SIZE * 1024**2, max_entries=64)
+parsing_parameters = ['start_row', 'col_date', 'col_pressure', 'col_temperature', 'format_date', 'custom_format',
+                      'resample_period', 'resample_gaps']
+
+# rendered PNGs per analysis, shared by /plot and /export and pre-rendered in the background after /analysis
+figure_cache = FigureCache(TEMP_DIR, max_bytes=FIGURE_CACHE_SIZE * 1024**2, max_disk_bytes=FIGURE_DISK_SIZE * 1024**2,
+                           temp_store=temp_store)
+figure_executor = ThreadPoolExecutor(max_workers=1)
+prerender_pending = {}  # analysis id: session path, of the pre-renders queued on figure_executor and not started yet
+prerender_lock = threading.Lock()
+report_plots = {plot_func.__name__: plot_func for plot_func in individual_plots()}
+
+# min/max/mean pyramids per analysis for /data, built in the background after /analysis
+pyramid_cache = LRUCache(max_bytes=PYRAMID_CACHE_SIZE * 1024**2)
+
+# reports of a bulk export are generated concurrently, the analyses of a session are remembered for it
+export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS)
+session_analyses_limit = 16
+
+# asynchronous /jobs analyses, finished jobs are kept for an hour to collect their result
+job_queue = JobQueue(workers=ANALYSIS_WORKERS, max_jobs=ANALYSIS_QUEUE_SIZE, ttl=3600)
+
+# tests pushed reading by reading from a logger, dropped after a day without readings
+live_tests = LiveTests(ttl=86400)
+live_defaults = {'start_row': 1, 'col_date': 1, 'col_pressure': 2, 'col_temperature': 3, 'format_date': 'unix',
+                 'custom_format': '', 'start_time': '', 'end_time': ''}
+
+metrics.register_collector(lambda: [
+    ('pressure_decay_cache_hits_total', 'counter', 'cache lookups that found an entry',
+     {'cache="result"': result_cache.hits, 'cache="figure"': figure_cache.memory.hits,
+      'cache="pyramid"': pyramid_cache.hits}),
+    ('pressure_decay_cache_misses_total', 'counter', 'cache lookups that found no entry',
+     {'cache="result"': result_cache.misses, 'cache="figure"': figure_cache.memory.misses,
+      'cache="pyramid"': pyramid_cache.misses}),
+    ('pressure_decay_cache_bytes', 'gauge', 'bytes held by a cache',
+     {'cache="result"': result_cache.size, 'cache="figure"': figure_cache.memory.size,
+      'cache="figure_disk"': figure_cache.disk.size, 'cache="pyramid"': pyramid_cache.size}),
+    ('pressure_decay_jobs_active', 'gauge', 'queued and running analysis jobs', {'': job_queue.active}),
+    ('pressure_decay_jobs_rejected_total', 'counter', 'jobs rejected by a full queue', {'': job_queue.rejected}),
+    ('pressure_decay_live_tests', 'gauge', 'running live tests', {'': len(live_tests.tests)})
+])
+
+
+def temp_store_metrics():
+
+    stats = temp_store.stats()
+
+    return [('pressure_decay_temp_bytes', 'gauge', 'bytes of the files in TEMP_DIR',
+             {f'kind="{kind}"': size for kind, (files, size) in stats['kinds'].items()}),
+            ('pressure_decay_temp_files', 'gauge', 'files in TEMP_DIR',
+             {f'kind="{kind}"': files for kind, (files, size) in stats['kinds'].items()}),
+            ('pressure_decay_temp_quota_bytes', 'gauge', 'disk quota of TEMP_DIR', {'': stats['max_bytes']}),
+            ('pressure_decay_temp_evictions_total', 'counter', 'files removed from TEMP_DIR',
+             {f'reason="{reason}"': count for reason, count in stats['evictions'].items()})]
+
+
+metrics.register_collector(temp_store_metrics)
+
 app.logger.info(f' APP_ENV={APP_ENV}, TEMP_DIR={TEMP_DIR}')
 print(f' APP_ENV={APP_ENV}, TEMP_DIR={TEMP_DIR}')
 
-def cleanup_files():
-    for filename in os.listdir(TEMP_DIR):
-        filepath = os.path.join(TEMP_DIR, filename)
+# expired jobs, live tests and files of this process, run by its own requests every few minutes
+housekeeping_interval = 300  # seconds
+housekeeping_due = time.monotonic() + housekeeping_interval
+housekeeping_lock = threading.Lock()
+
+
+def start_scheduler():
+
+    # TEMP_DIR is swept by one process only, also when idle, the lock passes on to a new process once its holder exits
+    if SCHEDULER == 'off' or (SCHEDULER == 'auto' and not acquire_lock(os.path.join(TEMP_DIR, 'scheduler.lock'))):
+        return None
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(func=temp_store.cleanup, trigger='interval', minutes=5)
+    scheduler.start()
+
+    return scheduler
+
+
+# plot worker processes import this module as well and must not start a scheduler or warm up.
+# a pre-fork server importing the app in its master (e.g. gunicorn --preload) runs this once for all its workers
+scheduler = None
+
+if multiprocessing.parent_process() is None:
+    scheduler = start_scheduler()
+
+    if WARM_UP == 'import':
+        warm_up()
+    elif WARM_UP == 'background':
+        threading.Thread(target=warm_up, daemon=True).start()
+
+
+@app.before_request
+def run_housekeeping():
+
+    global housekeeping_due
+
+    if time.monotonic() < housekeeping_due or not housekeeping_lock.acquire(blocking=False):
+        return
+
+    try:
+        housekeeping_due = time.monotonic() + housekeeping_interval
+        job_queue.cleanup()
+        live_tests.cleanup()
+        temp_store.cleanup(sweep=False)
+    finally:
+        housekeeping_lock.release()
+
+
+@app.before_request
+def start_request_metrics():
+
+    g.request_start = time.perf_counter()
+    g.profile = None
+
+    if metrics.METRICS_PROFILING and request.args.get('profile') in metrics.profile_kinds:
+        g.profile = metrics.start_profile(request.args['profile'])
 
-        try:
-            os.remove(filepath)
-        except Exception:
-            continue
 
+@app.after_request
+def record_request_metrics(response):
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(func=cleanup_files, trigger='cron', hour=3, minute=0)
-scheduler.start()
+    if g.get('profile'):
+        path = metrics.stop_profile(g.profile, TEMP_DIR, request.endpoint or 'unknown')
+        temp_store.add(path, 'profile')
+        response.headers['X-Profile'] = os.path.basename(path)
+
+    if 'request_start' in g:
+        metrics.observe('pressure_decay_http_request_duration_seconds', request.endpoint or 'unknown',
+                        time.perf_counter() - g.request_start)
+
+    return response
+
+
+@app.route('/metrics')
+def get_metrics():
+    return metrics.exposition(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+@app.route('/session/clear', methods=['POST'])
+def clear_session():
+
+    # the data and figures of every analysis of the browser session are removed right away instead of at their TTL
+    if 'session_id' in session:
+        temp_store.remove_owner(session['session_id'])
+
+    for entry in session.get('analyses', []):
+        temp_store.remove(entry['session_path'], 'session')
+        figure_cache.invalidate(entry['analysis_id'])
+        pyramid_cache.pop(entry['analysis_id'])
+
+    session.clear()
+
+    return render_template('index.html', params=None, results=None, errors=None)
+
+
+@app.context_processor
+def form_defaults():
+
+    # the form preselects the resampling period of the environment, the one a form without it is analysed with
+    return {'default_resample_period': RESAMPLE_PERIOD}
 
 
 @app.route('/')
@@ -50,34 +231,254 @@ def upload_file():
     file = request.files.get('file')
     raw_parameters = request.form.to_dict()
 
+    return render_analysis(analyse_upload(file, raw_parameters))
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+
+    file = request.files.get('file')
+    raw_parameters = request.form.to_dict()
+
+    if not file or file.filename == '':
+        return jsonify(error='no file has been uploaded'), 400
+
+    with tempfile.NamedTemporaryFile(delete=False, dir=TEMP_DIR, prefix='upload_') as upload:
+        file.save(upload)
+
+    # kept until the job is done with it
+    temp_store.add(upload.name, 'upload', pinned=True)
+    job_id = job_queue.submit(analysis_job, upload.name, file.filename, file.mimetype, raw_parameters)
+
+    if job_id is None:
+        temp_store.remove(upload.name)
+        return jsonify(error='analysis queue is full, retry later'), 503, {'Retry-After': '30'}
+
+    return jsonify(job_id=job_id, status_url=url_for('job_status', job_id=job_id),
+                   result_url=url_for('job_result', job_id=job_id)), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return jsonify(error='unknown or expired job'), 404
+
+    status = {key: job[key] for key in ['status', 'submitted', 'started', 'finished']}
+
+    if job['status'] == 'finished' and job['result']['stage'] != 'finished':
+        status['status'] = 'failed'
+        status['error'] = str(job['result']['error'])
+    elif job['status'] == 'finished':
+        status['results'] = job['result']['results']
+    elif job['status'] == 'failed':
+        status['error'] = str(job['error'])
+
+    return jsonify(job_id=job_id, **status)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return "unknown or expired job", 404
+
+    if job['status'] in ['queued', 'running']:
+        return jsonify(job_id=job_id, status=job['status']), 202
+
+    if job['status'] == 'failed':
+        return render_template('general_error.html', params=None, results=None, errors=job['error'])
+
+    return render_analysis(job['result'])
+
+
+@app.route('/live', methods=['POST'])
+def start_live_test():
+
+    raw_parameters = request.get_json(silent=True) or request.form.to_dict()
+
+    # a JSON body may send the checkbox as false, the form leaves it out
+    if not raw_parameters.get('periodic_limit_off'):
+        raw_parameters.pop('periodic_limit_off', None)
+
     try:
-        parameters = parameter_validation(raw_parameters)
-        data = file_validation(file, parameters)
+        parameters = parameter_validation({**live_defaults, **raw_parameters})
+
+        # the running fits of a live test are least squares sums
+        if parameters['trendline_method'] != 'least_squares':
+            raise ValueError('live tests only support least squares trendlines')
+
+        # the buckets of a live test are closed as the readings arrive, a gap is not known to end until the next one
+        if parameters['resample_gaps'] != 'drop':
+            raise ValueError('live tests do not interpolate missing buckets')
+
+        test_id = live_tests.create(parameters)
     except Exception as e:
-        return render_template('index.html', params=raw_parameters, results=None, errors=e)
+        return jsonify(error=str(e)), 400
+
+    return jsonify(test_id=test_id, readings_url=url_for('push_live_readings', test_id=test_id),
+                   status_url=url_for('live_status', test_id=test_id)), 201
+
+
+@app.route('/live/<test_id>/readings', methods=['POST'])
+def push_live_readings(test_id):
+
+    test = live_tests.get(test_id)
+
+    if test is None:
+        return jsonify(error='unknown or expired live test'), 404
+
+    readings = (request.get_json(silent=True) or {}).get('readings')
+
+    if not readings:
+        return jsonify(error='no readings, expected {"readings": [[date, pressure, temperature], ...]}'), 400
 
     try:
-        data, parameters = data_processing(data, parameters)
-        data, results = data_analysis(data, parameters)
+        dates, pressures, temperatures = zip(*readings)
+        dates = parse_date_format(pd.Series(dates), test.parameters['format_date'], test.parameters['custom_format'])
+        test.add_readings(dates, pressures, temperatures)
     except Exception as e:
-        return render_template('general_error.html', params=parameters, results=None, errors=e)
+        return jsonify(error=str(e)), 400
+
+    return jsonify(test_id=test_id, **test.status())
+
+
+@app.route('/live/<test_id>', methods=['GET', 'DELETE'])
+def live_status(test_id):
+
+    test = live_tests.pop(test_id) if request.method == 'DELETE' else live_tests.get(test_id)
+
+    if test is None:
+        return jsonify(error='unknown or expired live test'), 404
+
+    return jsonify(test_id=test_id, **test.status())
+
+
+def analysis_job(upload_path, filename, mimetype, raw_parameters):
+
+    try:
+        with open(upload_path, 'rb') as stream:
+            return analyse_upload(FileStorage(stream, filename=filename, content_type=mimetype), raw_parameters)
+    finally:
+        temp_store.remove(upload_path)
 
-    parameters = {key: value.isoformat() if isinstance(value, (datetime, pd.Timestamp)) else value
-                  for key, value in parameters.items()}
 
-    with tempfile.NamedTemporaryFile(delete=False, dir=TEMP_DIR, mode='w') as file:
-        json.dump(parameters, file)
-        session['parameters'] = file.name
+def analyse_upload(file, raw_parameters):
 
-    with tempfile.NamedTemporaryFile(delete=False, dir=TEMP_DIR, mode='w') as file:
-        json.dump(results, file)
-        session['results'] = file.name
+    try:
+        parameters = parameter_validation(raw_parameters)
+        upload_hash = file_hash(file)
+        analysis_key = upload_hash and cache_key(upload_hash, parameters, exclude=['system_name'])
+        resampled_key = upload_hash and cache_key(upload_hash, parameters, names=parsing_parameters)
+
+        cached = result_cache.get(analysis_key)
+        resampled = None if cached else result_cache.get(resampled_key)
+
+        if not cached and resampled is None:
+            data = file_validation(file, parameters)
+    except Exception as e:
+        return {'stage': 'validation', 'error': e, 'parameters': raw_parameters}
+
+    if cached:
+        data, cached_parameters, results = cached
+        parameters = {**cached_parameters, 'system_name': parameters['system_name']}
+    else:
+        try:
+            if resampled is None:
+                resampled = data if 'date_resampled' in data else data_resampling(data, parameters['resample_period'],
+                                                                                  parameters['resample_gaps'])
+                result_cache.put(resampled_key, resampled)
+
+            data, parameters = data_processing(resampled.copy(), parameters)
+            data, results = data_analysis(data, parameters)
+        except Exception as e:
+            return {'stage': 'analysis', 'error': e, 'parameters': parameters}
+
+        parameters = {key: value.isoformat() if isinstance(value, (datetime, pd.Timestamp)) else value
+                      for key, value in parameters.items()}
+
+        result_cache.put(analysis_key, (data, parameters, results))
+
+    analysis_id = hashlib.sha256(analysis_key.encode()).hexdigest()[:16]
+    session_path = save_session(TEMP_DIR, data, parameters, results)
+    temp_store.add(session_path, 'session')
+
+    # the queued pre-render holds the analysis id rather than the analysed data, an analysis already waiting for one is
+    # not queued again but renders from its latest session file
+    with prerender_lock:
+        if analysis_id not in prerender_pending:
+            figure_executor.submit(render_figures, analysis_id)
+        prerender_pending[analysis_id] = session_path
+
+    return {'stage': 'finished', 'parameters': parameters, 'results': results, 'session_path': session_path,
+            'analysis_id': analysis_id}
+
+
+def render_analysis(outcome):
+
+    if outcome['stage'] == 'validation':
+        return render_template('index.html', params=outcome['parameters'], results=None, errors=outcome['error'])
+
+    if outcome['stage'] == 'analysis':
+        return render_template('general_error.html', params=outcome['parameters'], results=None,
+                               errors=outcome['error'])
+
+    session['session_path'] = outcome['session_path']
+    session['analysis_id'] = outcome['analysis_id']
+    session_id = session.setdefault('session_id', uuid.uuid4().hex)
+    temp_store.assign(outcome['session_path'], session_id)
+
+    previous = session.get('analyses', [])
+    analyses = [entry for entry in previous if entry['analysis_id'] != outcome['analysis_id']]
+    analyses.append({'analysis_id': outcome['analysis_id'], 'session_path': outcome['session_path'],
+                     'system_name': outcome['parameters']['system_name']})
+    session['analyses'] = analyses[-session_analyses_limit:]
+
+    # data of a repeated analysis and of analyses no longer remembered by the session cannot be reached anymore
+    kept = [entry['session_path'] for entry in session['analyses']]
+    for entry in previous:
+        if entry['session_path'] not in kept:
+            temp_store.remove(entry['session_path'], 'session')
+
+    return render_template('index.html', params=outcome['parameters'], results=outcome['results'], errors=None)
 
-    with tempfile.NamedTemporaryFile(delete=False, dir=TEMP_DIR, mode='w') as file:
-        file.write(data.to_json())
-        session['data_path'] = file.name
 
-    return render_template('index.html', params=parameters, results=results, errors=None)
+def render_figures(analysis_id):
+
+    with prerender_lock:
+        session_path = prerender_pending.pop(analysis_id)
+
+    # the data is read (memory mapped) once the pre-render runs, a session exported or expired by then is skipped
+    try:
+        with temp_store.reading(session_path):
+            _, results = load_session(session_path)
+            data = load_data(session_path)
+
+            get_pyramid(analysis_id, lambda: data)
+            figure_cache.get(analysis_id, 'overview', lambda: plot_all(data, results, dpi=preview_dpi))
+            report_images(analysis_id, data, results)
+    except (ValueError, FileNotFoundError):
+        pass
+
+
+def get_pyramid(analysis_id, load):
+
+    pyramid = pyramid_cache.get(analysis_id)
+
+    if pyramid is None:
+        pyramid = build_pyramid(load())
+        pyramid_cache.put(analysis_id, pyramid, size=pyramid['bytes'])
+
+    return pyramid
+
+
+def report_images(analysis_id, data, results):
+    return figure_cache.get_many(analysis_id, list(report_plots),
+                                 lambda names: plot_panels([report_plots[name] for name in names], data, results))
 
 
 @app.route('/instructions')
@@ -88,45 +489,86 @@ def show_instructions():
 @app.route('/plot')
 def get_plot():
 
-    data = session.get('data_path')
-    results = session.get('results')
+    session_path = session.get('session_path')
+    analysis_id = session.get('analysis_id')
+
+    if not session_path or not analysis_id:
+        return "missing files", 400
 
-    if not data or not results:
+    try:
+        with temp_store.reading(session_path):
+            _, results = load_session(session_path)
+            data = load_data(session_path)
+
+            # a failing render is not a missing session file
+            try:
+                img = figure_cache.get(analysis_id, 'overview', lambda: plot_all(data, results, dpi=preview_dpi))
+            except Exception as e:
+                return f"plot cannot be rendered: {e}", 500
+    except (ValueError, FileNotFoundError):
         return "missing files", 400
 
-    data = pd.read_json(data)
-    with open(results, 'r') as file:
-        results = json.load(file)
+    return send_file(io.BytesIO(img), mimetype='image/png')
+
 
-    img = plot_all(data, results)
-    return send_file(img, mimetype='image/png')
+@app.route('/data')
+def get_data():
+
+    session_path = session.get('session_path')
+    analysis_id = session.get('analysis_id')
+
+    # another analysis of the session by its id, by default the last one
+    if request.args.get('analysis'):
+        entry = next((entry for entry in session.get('analyses', [])
+                      if entry['analysis_id'] == request.args['analysis']), None)
+        if entry is None:
+            return jsonify(error='unknown analysis'), 404
+        session_path, analysis_id = entry['session_path'], entry['analysis_id']
+
+    if not session_path or not analysis_id:
+        return jsonify(error='missing files'), 400
+
+    # a time range in hours since the start of the test, at about the resolution of the chart asking for it
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    points = request.args.get('points', default_points, type=int)
+    columns = request.args['columns'].split(',') if request.args.get('columns') else None
+    stats = request.args['stats'].split(',') if request.args.get('stats') else None
+
+    try:
+        with temp_store.reading(session_path):
+            data = load_data(session_path)
+            detail = level_of_detail(get_pyramid(analysis_id, lambda: data), data, start, end, points, columns,
+                                     stats)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(analysis_id=analysis_id, **detail)
 
 
 @app.route('/export')
 def export_data():
 
-    data_path = session.get('data_path')
-    parameters = session.get('parameters')
-    results = session.get('results')
+    session_path = session.get('session_path')
+    analysis_id = session.get('analysis_id')
 
-    if not data_path or not results:
+    if not session_path or not analysis_id:
         return "missing files", 400
 
-    with open(parameters, 'r') as file:
-        parameters = json.load(file)
-
-    with open(results, 'r') as file:
-        results = json.load(file)
-
     try:
-        data = pd.read_json(data_path)
+        with temp_store.reading(session_path):
+            parameters, results = load_session(session_path)
+            data = load_data(session_path)
+
+            try:
+                images = [io.BytesIO(image) for image in report_images(analysis_id, data, results)]
+            except Exception as e:
+                return render_template('general_error.html', params=parameters, results=None, errors=e)
     except (ValueError, FileNotFoundError):
-        return render_template('index.html', params=parameters, results=None,
+        return render_template('index.html', params=None, results=None,
                                errors='data file cannot be read. data has either been deleted or is not present '
                                       '(data will automatically delete after export)')
 
-    images = plot_individual(data, results)
-
     try:
         doc = export_word(parameters, results, images)
     except Exception as e:
@@ -139,12 +581,136 @@ def export_data():
     current_date = datetime.now().strftime('%Y%m%d')
     file_name = current_date + '_pressure-decay-test_' + parameters['system_name'].replace(' ', '_') + '.docx'
 
-    os.remove(data_path)
+    temp_store.remove(session_path)
+    figure_cache.invalidate(analysis_id)
+    pyramid_cache.pop(analysis_id)
 
     return send_file(file, as_attachment=True, download_name=file_name,
                      mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
 
 
+@app.route('/export/bulk', methods=['GET', 'POST'])
+def export_bulk():
+
+    analyses = session.get('analyses', [])
+
+    # a selection of the session's analyses and/or finished /jobs analyses, by default every analysis of the session
+    if request.values.get('analyses'):
+        selected = request.values['analyses'].split(',')
+        analyses = [entry for entry in analyses if entry['analysis_id'] in selected]
+    elif request.values.get('jobs'):
+        analyses = []
+
+    for job_id in filter(None, request.values.get('jobs', '').split(',')):
+        job = job_queue.get(job_id)
+        if job and job['status'] == 'finished' and job['result']['stage'] == 'finished':
+            analyses.append({'analysis_id': job['result']['analysis_id'], 'session_path': job['result']['session_path'],
+                             'system_name': job['result']['parameters']['system_name']})
+
+    if not analyses:
+        return "missing files", 400
+
+    summary = request.values.get('summary') in ['1', 'true', 'on']
+    file_name = datetime.now().strftime('%Y%m%d') + '_pressure-decay-tests.zip'
+
+    return Response(stream_with_context(bulk_report_archive(analyses, summary)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={file_name}'})
+
+
+def bulk_report_archive(analyses, summary):
+
+    stream = ArchiveStream()
+    futures = [export_executor.submit(bulk_report, entry) for entry in analyses]
+    reports = []
+    errors = []
+    names = set()
+
+    # the archive is written in the order the reports finish, every finished report is sent on right away
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for future in as_completed(futures):
+            try:
+                parameters, results, document = future.result()
+            except Exception as e:
+                errors.append(str(e))
+                continue
+
+            name = report_name(parameters['system_name'], names)
+            archive.writestr(name, document)
+            reports.append((parameters, results))
+
+            yield stream.pop()
+
+        if summary and reports:
+            reports.sort(key=lambda report: report[0]['system_name'])
+            document = io.BytesIO()
+            export_summary(reports).save(document)
+            archive.writestr(datetime.now().strftime('%Y%m%d') + '_pressure-decay-tests_summary.docx',
+                             document.getvalue())
+
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+
+    yield stream.pop()
+
+
+def bulk_report(entry):
+
+    name = entry.get('system_name', entry['analysis_id'])
+
+    try:
+        with temp_store.reading(entry['session_path']):
+            parameters, results = load_session(entry['session_path'])
+            data = load_data(entry['session_path'])
+
+            # a failing render is not a missing session file
+            try:
+                images = [io.BytesIO(image) for image in report_images(entry['analysis_id'], data, results)]
+            except Exception as e:
+                raise RuntimeError(f'{name}: the report plots cannot be rendered ({e})') from e
+    except (ValueError, FileNotFoundError):
+        raise FileNotFoundError(f"{name}: data file cannot be read, it has been exported and deleted or has expired")
+
+    document = io.BytesIO()
+    export_word(parameters, results, images).save(document)
+
+    return parameters, results, document.getvalue()
+
+
+def report_name(system_name, names):
+
+    name = datetime.now().strftime('%Y%m%d') + '_pressure-decay-test_' + system_name.replace(' ', '_')
+    unique_name = name
+    counter = 1
+
+    while unique_name in names:
+        counter += 1
+        unique_name = f'{name}_{counter}'
+
+    names.add(unique_name)
+
+    return unique_name + '.docx'
+
+
+class ArchiveStream(io.RawIOBase):
+
+    # write-only file object that zipfile writes the archive to, the written bytes are taken out after every member,
+    # as it cannot seek zipfile writes the sizes after each member instead of in its header
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
 if __name__ == "__main__":
     if APP_ENV == 'local':
         app.run(debug=True)
@@ -0,0 +1,229 @@
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from werkzeug.datastructures import FileStorage
+from utils.validation import file_validation, parameter_validation
+from utils.analysis import data_processing, data_analysis
+from utils.plot import plot_individual
+from utils.export import export_word
+
+file_extensions = ('.csv', '.xls', '.xlsx')
+mimetypes = {
+    'csv': 'text/csv',
+    'xls': 'application/vnd.ms-excel',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+summary_columns = ['file', 'report', 'status', 'error', 'mass_rate', 'ideal_gas_rate', 'bubble_rate', 'periods',
+                   'measured_volume', 'stabilization_time', 'total_test_time', 'seconds']
+
+
+def collect_files(source):
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return [(source, name, name) for name in sorted(archive.namelist())
+                    if name.lower().endswith(file_extensions) and not name.endswith('/')]
+
+    return [(os.path.join(root, name), None, os.path.relpath(os.path.join(root, name), source))
+            for root, _, names in sorted(os.walk(source)) for name in sorted(names)
+            if name.lower().endswith(file_extensions)]
+
+
+def report_names(names):
+
+    # named after the path below the source, files of the same name in different directories or zip members do not
+    # overwrite each other's report. A name that is still taken (sys1.csv and sys1.xlsx) gets a number
+    reports = []
+    taken = set()
+
+    for name in names:
+        stem = os.path.splitext(name)[0].replace('\\', '/').strip('/').replace('/', '_').replace(' ', '_')
+        report, number = stem, 1
+
+        while report in taken:
+            number += 1
+            report = f'{stem}_{number}'
+
+        reports.append(report)
+        taken.add(report)
+
+    return [datetime.now().strftime('%Y%m%d') + '_pressure-decay-test_' + report + '.docx' for report in reports]
+
+
+def read_parameters(path):
+
+    with open(path, 'r') as file:
+        raw_parameters = json.load(file)
+
+    raw_parameters = {key: '' if value is None else value for key, value in raw_parameters.items()}
+
+    for key in ['start_time', 'end_time', 'custom_format']:
+        raw_parameters.setdefault(key, '')
+
+    # the web form only sends the checkbox when it is ticked
+    if not raw_parameters.get('periodic_limit_off'):
+        raw_parameters.pop('periodic_limit_off', None)
+
+    return raw_parameters
+
+
+def analyse_file(path, member, name, raw_parameters, report_dir, report_name=None):
+
+    row = {'file': name, 'report': '', 'status': 'ok', 'error': ''}
+    start = time.perf_counter()
+
+    try:
+        if member:
+            with zipfile.ZipFile(path) as archive:
+                content = archive.read(member)
+        else:
+            with open(path, 'rb') as file:
+                content = file.read()
+
+        filename = os.path.basename(name)
+        file = FileStorage(io.BytesIO(content), filename=filename,
+                           content_type=mimetypes.get(filename.rsplit('.')[-1].lower()))
+
+        parameters = parameter_validation({**raw_parameters, 'system_name': filename.rsplit('.', 1)[0]})
+        data = file_validation(file, parameters)
+        data, parameters = data_processing(data, parameters)
+        data, results = data_analysis(data, parameters)
+
+        row.update({key: results[key] for key in summary_columns if key in results})
+
+        if report_dir:
+            parameters = {key: value.isoformat() if isinstance(value, (datetime, pd.Timestamp)) else value
+                          for key, value in parameters.items()}
+
+            doc = export_word(parameters, results, plot_individual(data, results, workers=1))
+            report_name = report_name or report_names([name])[0]
+            doc.save(os.path.join(report_dir, report_name))
+            row['report'] = report_name
+    except Exception as e:
+        row.update({'status': 'failed', 'error': str(e)})
+
+    row['seconds'] = round(time.perf_counter() - start, 3)
+
+    return row
+
+
+def run_batch(source, parameters_path, output, report_dir=None, workers=None):
+
+    files = collect_files(source)
+    raw_parameters = read_parameters(parameters_path)
+
+    if not files:
+        raise FileNotFoundError(f'no {", ".join(file_extensions)} files found in {source}')
+
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+
+    rows = []
+    start = time.perf_counter()
+
+    def record(row):
+        rows.append(row)
+        print(f"[{len(rows)}/{len(files)}] {row['file']}: {row['status']} {row['error']}", flush=True)
+
+    queue = deque((path, member, name, raw_parameters, report_dir, report_name)
+                  for (path, member, name), report_name in zip(files, report_names([name for *_, name in files])))
+
+    # a worker killed while analysing (out of memory) breaks the whole pool and fails every file it was running. Those
+    # files are analysed once more on their own, only a file that kills its worker alone is recorded as failed, and
+    # the rest of the batch goes on in a new pool
+    while queue:
+        for job in run_pool(queue, workers or os.cpu_count() or 1, record):
+            if run_pool(deque([job]), 1, record):
+                record({'file': job[2], 'report': '', 'status': 'failed',
+                        'error': 'the worker process analysing the file was killed (out of memory?)'})
+
+    elapsed = time.perf_counter() - start
+
+    summary = pd.DataFrame(rows, columns=summary_columns).sort_values('file')
+    summary.to_csv(output, index=False)
+
+    failed = (summary.status != 'ok').sum()
+    print(f'{len(files)} files ({failed} failed) in {elapsed:.1f} s, {len(files)/elapsed:.2f} files/s, '
+          f'summary written to {output}')
+
+    return summary
+
+
+def run_pool(queue, workers, record):
+
+    # at most one file per worker is handed to the pool at a time, so a broken pool only fails the files it was
+    # running. Returns those files, the files not started yet stay in the queue
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+
+        while queue or running:
+            # a worker may die after the wait below, the pool then refuses new files. A file only leaves the queue
+            # once the pool has taken it
+            try:
+                while queue and len(running) < workers:
+                    running[executor.submit(analyse_file, *queue[0])] = queue[0]
+                    queue.popleft()
+            except BrokenProcessPool:
+                return unfinished(running, record)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                return unfinished(running, record)
+
+            for future in done:
+                record(future.result())
+                del running[future]
+
+    return []
+
+
+def unfinished(running, record):
+
+    # the files of a broken pool that were finished before it broke are recorded, the ones it was running returned
+    wait(running)
+    jobs = []
+
+    for future, job in running.items():
+        if isinstance(future.exception(), BrokenProcessPool):
+            jobs.append(job)
+        else:
+            record(future.result())
+
+    return jobs
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Analyse a directory or zip archive of pressure decay logger files. '
+                                                 'The system name of every file is its file name.')
+    parser.add_argument('source', help='directory (searched recursively) or zip archive of .csv/.xls/.xlsx files')
+    parser.add_argument('--parameters', required=True,
+                        help='JSON file with the fields of the web form, e.g. {"start_row": 1, "col_date": 1, ...}')
+    parser.add_argument('--output', default='summary.csv', help='summary table (CSV)')
+    parser.add_argument('--reports', help='directory to write a Word report per file to')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: number of cores)')
+    args = parser.parse_args()
+
+    source, parameters, output = (os.path.abspath(path) for path in [args.source, args.parameters, args.output])
+    reports = args.reports and os.path.abspath(args.reports)
+
+    # the report template is looked up relative to the backend directory, as for the web app
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    summary = run_batch(source, parameters, output, reports, args.workers)
+
+    sys.exit(1 if (summary.status != 'ok').all() else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import logger_data, date_formats
+from utils.dates import parse_date_format
+
+
+def parse_date_format_apply(date_series, format_type, custom_format=None):
+
+    # the parser before format detection, kept as the reference
+    formats = {
+        'simex': ("%d/%m/%Y %H:%M:%S", None),
+        'scada': ("%Y/%m/%d %H:%M:%S.%f", None),
+        'xls': (None, 's'),
+        'unix': (None, 's'),
+        'custom': (custom_format, None)
+    }
+
+    if format_type == 'xls':
+        date_series = date_series.apply(lambda t: 86400 * t - 2209161600)
+
+    try:
+        return pd.to_datetime(date_series, format=formats[format_type][0], unit=formats[format_type][1])
+    except Exception:
+        return pd.to_datetime(date_series)
+
+
+def benchmark(n_rows, interval):
+
+    dates = logger_data(n_rows * interval / 86400, interval).date
+    dates = dates.iloc[:n_rows]
+
+    cases = [(name, name, date_formats[name](dates)) for name in date_formats]
+    # a logger with a different date layout than the selected type, the old parser guessed per element
+    cases.append(('iso as simex', 'simex', dates.dt.strftime('%Y-%m-%d %H:%M:%S')))
+
+    for name, format_type, column in cases:
+
+        if format_type in ['simex', 'scada']:
+            column = column.astype(object)
+
+        start = time.perf_counter()
+        reference = parse_date_format_apply(column, format_type)
+        time_apply = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed = parse_date_format(column, format_type)
+        time_fast = time.perf_counter() - start
+
+        same = (abs(parsed - reference) < pd.Timedelta(milliseconds=1)).all()
+
+        print(f'{name:<14} {n_rows:>9} rows, every {interval:>4} s | before {time_apply:7.3f} s | '
+              f'now {time_fast:7.3f} s | {time_apply/time_fast:6.1f}x | same dates: {same}')
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    benchmark(n_rows, 1)
+    # ten readings per second logged with whole second timestamps
+    benchmark(n_rows, 0.1)
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from CoolProp.CoolProp import PropsSI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.density import compute_density, get_table
+
+media = ['CO2', 'argon', 'forming gas', 'air', 'nitrogen', 'krypton', 'ammonia']
+
+
+def propssi_row_density(data, medium):
+
+    if medium == 'forming gas':
+        medium = 'nitrogen[0.95]&hydrogen[0.05]'
+
+    try:
+        return PropsSI('D', 'T', data.temperature + 273.15, 'P', data.pressure*1e5, medium)
+    except Exception:
+        return np.nan
+
+
+def synthetic_data(n_points):
+
+    hours = np.arange(n_points) / 60
+    temperature = 20 + 2*np.sin(2*np.pi*hours/24)
+
+    return pd.DataFrame({'pressure': 5*(temperature + 273.15)/293.15, 'temperature': temperature})
+
+
+def benchmark(n_points):
+
+    data = synthetic_data(n_points)
+
+    print(f'{"medium":<12} {"points":>8} {"apply [s]":>10} {"engine [s]":>11} {"speedup":>8} {"max rel. diff":>14} '
+          f'{"table [s]":>10} {"speedup":>8} {"max rel. diff":>14}')
+
+    for medium in media:
+
+        start = time.perf_counter()
+        reference = data.apply(lambda data_row: propssi_row_density(data_row, medium), axis=1).to_numpy()
+        time_apply = time.perf_counter() - start
+
+        start = time.perf_counter()
+        density = compute_density(data.temperature.to_numpy(), data.pressure.to_numpy(), medium)
+        time_engine = time.perf_counter() - start
+
+        get_table(medium)
+
+        start = time.perf_counter()
+        density_table = compute_density(data.temperature.to_numpy(), data.pressure.to_numpy(), medium, mode='table')
+        time_table = time.perf_counter() - start
+
+        difference = np.nanmax(np.abs(density - reference) / reference)
+        difference_table = np.nanmax(np.abs(density_table - reference) / reference)
+
+        print(f'{medium:<12} {n_points:>8} {time_apply:>10.3f} {time_engine:>11.3f} '
+              f'{time_apply/time_engine:>7.0f}x {difference:>14.1e} '
+              f'{time_table:>10.4f} {time_apply/time_table:>7.0f}x {difference_table:>14.1e}')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
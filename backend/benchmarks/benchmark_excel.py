@@ -0,0 +1,75 @@
+import io
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.datastructures import FileStorage
+from generate_data import logger_file, n_readings, parameters
+from utils.validation import read_file, read_excel_columns, parameter_validation
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def load(loader, path):
+
+    with open(path, 'rb') as file:
+        upload = FileStorage(io.BytesIO(file.read()), filename=os.path.basename(path), content_type=mimetype)
+
+    file_parameters = parameter_validation({**parameters, 'system_name': 'benchmark', 'format_date': 'xls',
+                                            'medium': 'nitrogen'})
+    start = time.perf_counter()
+
+    if loader == 'read_excel':
+        # the loader before the streaming reader: every cell of the sheet, then the three columns
+        data = read_file(upload)
+        data = data.iloc[file_parameters['start_row'] - 1:, [0, 2, 3]].reset_index(drop=True)
+    else:
+        data = read_excel_columns(upload, file_parameters)
+
+    seconds = time.perf_counter() - start
+
+    return {'seconds': seconds, 'rows': len(data), 'max_rss_mb': peak_memory() / 1024**2,
+            'checksum': float(data.iloc[:, 1].astype(float).sum())}
+
+
+def peak_memory():
+
+    # ru_maxrss is inherited from the parent process on linux, the high water mark of the own memory map is not
+    try:
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmHWM'))
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def benchmark(days):
+
+    path = logger_file(data_dir, days, 1, 'xls', 'nitrogen', 'xlsx')
+    print(f'{os.path.basename(path)}: {n_readings(days, 1)} rows, {os.path.getsize(path)/1e6:.1f} MB')
+
+    # each loader in a fresh process, so the peak memory of one does not hide the other
+    results = {}
+    for loader in ['read_excel', 'read_excel_columns']:
+        output = subprocess.run([sys.executable, __file__, '--load', loader, path], capture_output=True, text=True,
+                                check=True).stdout
+        results[loader] = json.loads(output.splitlines()[-1])
+
+        print(f"{loader:<20} {results[loader]['seconds']:8.1f} s   peak RSS {results[loader]['max_rss_mb']:7.0f} MB   "
+              f"{results[loader]['rows']} rows")
+
+    print(f"{results['read_excel']['seconds'] / results['read_excel_columns']['seconds']:.1f}x faster, "
+          f"same values: {results['read_excel']['checksum'] == results['read_excel_columns']['checksum']}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--load':
+        print(json.dumps(load(sys.argv[2], sys.argv[3])))
+    else:
+        # 11.5 days at 1 s is just under a million rows, close to the row limit of a sheet
+        benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 11.5)
@@ -0,0 +1,118 @@
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from docx import Document
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, backend_dir)
+
+from benchmark_storage import analysed_data
+from utils.export import export_word, document_paragraphs, template_path
+from utils.plot import plot_individual, individual_plots
+
+parameters = {'system_name': 'benchmark circuit', 'medium': 'nitrogen', 'volume': 10.0, 'unit_volume': 'liter',
+              'mass': None, 'periodic_limit_off': False, 'start_time': '2024-03-01T08:00:00', 'end_time': ''}
+results = {'measured_volume': None, 'trendline_parameters_mass': (-4e-7, 0.069),
+           'trendline_parameters_P/T': (-1e-7, 0.0205), 'mass_rate': 4, 'ideal_gas_rate': 6, 'bubble_rate': 0.3,
+           'stabilization_time': 0.0, 'total_test_time': 72.0, 'periods': 3.0}
+
+
+def export_word_per_placeholder(parameters, results, images):
+
+    # the report generation before the preloaded template, kept as the reference:
+    # the template is read from disk and every paragraph is scanned once per placeholder
+    doc = Document(template_path)
+
+    volume, unit_volume = parameters['volume'], parameters['unit_volume']
+    mass, unit_mass = round(results['trendline_parameters_mass'][1], 2), 'kg'
+    end_time = (datetime.strptime(parameters['start_time'], '%Y-%m-%dT%H:%M:%S')
+                + timedelta(hours=24)*int(results['periods'])).strftime('%d-%m-%Y %H:%M:%S')
+
+    placers = {
+        '{system}': parameters['system_name'], '{medium}': parameters['medium'], '{volume}': str(volume),
+        '{unit_volume}': unit_volume, '{mass}': str(mass), '{unit_mass}': unit_mass,
+        '{leak_rate_refprop}': str(results['mass_rate']), '{leak_rate_ideal}': str(results['ideal_gas_rate']),
+        '{bubble_rate}': str(results['bubble_rate']), '{current_date}': datetime.now().strftime('%d-%m-%Y'),
+        '{stabilization_time}': str(results['stabilization_time']),
+        '{total_test_time}': str(results['total_test_time']),
+        '{start_time}': datetime.strptime(parameters['start_time'], '%Y-%m-%dT%H:%M:%S').strftime('%d-%m-%Y %H:%M:%S'),
+        '{end_time}': end_time
+    }
+
+    target_starts = ['Leak rate (mass-density)', 'Leak rate (ideal gas law)', 'Bubble diameter rate']
+
+    def replace_text(paragraphs):
+        for paragraph in paragraphs:
+            for placeholder, value in placers.items():
+                if placeholder in paragraph.text:
+                    paragraph.text = paragraph.text.replace(placeholder, value)
+
+    replace_text(doc.paragraphs)
+
+    for paragraph in doc.paragraphs:
+        for start in target_starts:
+            if paragraph.text.startswith(start):
+                prefix, suffix = paragraph.text.split(':')
+                paragraph.clear()
+                paragraph.add_run(prefix + ':')
+                paragraph.add_run(suffix).bold = True
+
+    for section in doc.sections:
+        page_width = section.page_width - section.left_margin - section.right_margin
+        for table in section.first_page_header.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    replace_text(cell.paragraphs)
+
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for placeholder, value in placers.items():
+                    if placeholder in cell.text:
+                        for paragraph in cell.paragraphs:
+                            for run in paragraph.runs:
+                                run.text = run.text.replace(placeholder, value)
+                            paragraph.text = paragraph.text.replace(placeholder, value)
+
+    for image in images:
+        doc.add_picture(image, width=page_width)
+
+    return doc
+
+
+def report_text(doc):
+    return [paragraph.text for paragraph in document_paragraphs(doc)]
+
+
+def benchmark(export, images, repeat):
+
+    timings = []
+
+    for _ in range(repeat):
+        for image in images:
+            image.seek(0)
+
+        start = time.perf_counter()
+        doc = export(parameters, results, images)
+        doc.save(io.BytesIO())
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), doc
+
+
+if __name__ == '__main__':
+    os.chdir(backend_dir)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    export_word(parameters, results, [])  # parses the template
+
+    report = f'with the {len(individual_plots())} report plots'
+
+    for name, images in [('text only', []), (report, plot_individual(analysed_data(4320), results))]:
+        before, doc_before = benchmark(export_word_per_placeholder, images, repeat)
+        now, doc_now = benchmark(export_word, images, repeat)
+
+        print(f'{name:<24} | before {before*1000:7.1f} ms | now {now*1000:7.1f} ms | {before/now:4.1f}x | '
+              f'same text: {report_text(doc_before) == report_text(doc_now)}')
@@ -0,0 +1,90 @@
+import os
+import sys
+import argparse
+import tracemalloc
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, backend_dir)
+
+from generate_data import logger_file, n_readings, parameters
+from benchmark_pipeline import upload, data_dir
+from utils.validation import file_validation, parameter_validation
+from utils.analysis import data_resampling, data_processing, data_analysis
+from utils.metrics import start_memory, stop_memory
+
+# (days, interval [s], medium)
+cases = [(7, 10, 'nitrogen'), (30, 60, 'CO2'), (2, 1, 'nitrogen'), (7, 1, 'forming gas')]
+
+# peak memory allocated by a stage over what it started with, per megabyte of the uploaded csv file
+budgets = {
+    'file_validation': 5,
+    'data_resampling': 3,
+    'data_processing': 1.25,
+    'data_analysis': 3
+}
+
+
+def traced(peaks, stage, func, *args):
+
+    # the stages reset the peak themselves (metrics.instrument), start/stop_memory carry it over
+    start = start_memory()
+    result = func(*args)
+    peaks[stage] = stop_memory(start)
+
+    return result
+
+
+def run_case(days, interval, medium):
+
+    path = logger_file(data_dir, days, interval, 'simex', medium, 'csv')
+    case_parameters = parameter_validation({**parameters, 'system_name': 'benchmark', 'format_date': 'simex',
+                                            'medium': medium})
+    peaks = {}
+
+    tracemalloc.start()
+
+    try:
+        data = traced(peaks, 'file_validation', file_validation, upload(path), case_parameters)
+
+        if 'date_resampled' not in data:
+            data = traced(peaks, 'data_resampling', data_resampling, data)
+
+        data, processed_parameters = traced(peaks, 'data_processing', data_processing, data, case_parameters.copy())
+        traced(peaks, 'data_analysis', data_analysis, data, processed_parameters)
+    finally:
+        tracemalloc.stop()
+
+    return os.path.getsize(path) / 1024**2, peaks
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Peak memory of every pipeline stage per megabyte of input, '
+                                                 'checked against a budget.')
+    parser.parse_args()
+
+    # the report template and the density tables are looked up relative to the backend directory
+    os.chdir(backend_dir)
+
+    over_budget = []
+
+    for days, interval, medium in cases:
+        size, peaks = run_case(days, interval, medium)
+        print(f'{days} days at {interval} s, {medium} ({n_readings(days, interval)} rows, {size:.1f} MB)')
+
+        for stage, peak in peaks.items():
+            ratio = peak / 1024**2 / size
+            over = ratio > budgets[stage]
+            print(f'    {stage:<16} {peak / 1024**2:8.1f} MB   {ratio:5.2f} MB/MB   budget {budgets[stage]:>4} MB/MB'
+                  + ('   OVER BUDGET' if over else ''))
+
+            if over:
+                over_budget.append(stage)
+
+    print(f'{len(over_budget)} stage(s) over their memory budget')
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from datetime import datetime
+import pandas as pd
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, backend_dir)
+
+from werkzeug.datastructures import FileStorage
+from generate_data import logger_file, n_readings, parameters, date_formats, fill_pressures
+from utils.validation import file_validation, parameter_validation, read_file, parse_date_format, STREAMING_THRESHOLD
+from utils.analysis import data_resampling, data_processing, data_analysis
+from utils.plot import plot_all, plot_individual, preview_dpi
+from utils.export import export_word
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+baseline_dir = os.path.join(benchmark_dir, 'baselines')
+data_dir = os.path.join(benchmark_dir, 'data')
+
+mimetypes = {'csv': 'text/csv', 'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+regression_factor = 1.25  # slower than the baseline by more than this is reported as a regression
+noise_floor = 0.005  # seconds, stages faster than this are too noisy to compare
+
+# (days, interval [s], date format, medium, file format)
+profiles = {
+    'quick': [(1, 60, date_format, 'nitrogen', file_format) for file_format in ['csv', 'xlsx']
+              for date_format in date_formats]
+             + [(7, 10, 'simex', medium, 'csv') for medium in fill_pressures]
+             + [(30, 60, 'scada', 'nitrogen', 'csv'), (7, 60, 'unix', 'forming gas', 'xlsx')],
+    'full': [(30, 1, 'simex', 'nitrogen', 'csv'), (365, 60, 'scada', 'CO2', 'csv'), (12, 1, 'xls', 'argon', 'xlsx'),
+             (365, 1, 'unix', 'nitrogen', 'csv')]
+}
+stages = ['read_file', 'parse_date_format', 'file_validation', 'data_resampling', 'data_processing', 'data_analysis',
+          'plot_all', 'plot_individual', 'export_word', 'end_to_end']
+
+
+def upload(path):
+
+    extension = path.rsplit('.')[-1]
+    with open(path, 'rb') as file:
+        return FileStorage(io.BytesIO(file.read()), filename=os.path.basename(path), content_type=mimetypes[extension])
+
+
+def timed(timings, stage, func, *args):
+
+    start = time.perf_counter()
+    result = func(*args)
+    timings[stage] = min(timings.get(stage, float('inf')), time.perf_counter() - start)
+
+    return result
+
+
+def run_case(days, interval, date_format, medium, file_format, repeat):
+
+    path = logger_file(data_dir, days, interval, date_format, medium, file_format)
+    case_parameters = parameter_validation({**parameters, 'system_name': 'benchmark', 'format_date': date_format,
+                                            'medium': medium})
+    streamed = os.path.getsize(path) > STREAMING_THRESHOLD
+    timings = {}
+
+    for _ in range(repeat):
+
+        # stages on their own, each on the output of the previous stage
+        if not streamed:
+            raw = timed(timings, 'read_file', read_file, upload(path))
+            dates = raw.iloc[:, case_parameters['col_date'] - 1]
+            timed(timings, 'parse_date_format', parse_date_format, dates, date_format, '')
+
+        data = timed(timings, 'file_validation', file_validation, upload(path), case_parameters)
+
+        if 'date_resampled' not in data:
+            data = timed(timings, 'data_resampling', data_resampling, data)
+
+        data, processed_parameters = timed(timings, 'data_processing', data_processing, data, case_parameters.copy())
+        data, results = timed(timings, 'data_analysis', data_analysis, data, processed_parameters)
+
+        timed(timings, 'plot_all', plot_all, data, results, preview_dpi)
+        images = timed(timings, 'plot_individual', plot_individual, data, results)
+
+        report_parameters = {key: value.isoformat() if isinstance(value, (datetime, pd.Timestamp)) else value
+                             for key, value in processed_parameters.items()}
+        timed(timings, 'export_word', lambda: export_word(report_parameters, results, images).save(io.BytesIO()))
+
+        # the same work as an upload, a plot and an export of the web app
+        timed(timings, 'end_to_end', end_to_end, upload(path), case_parameters.copy())
+
+    return {'file': os.path.basename(path), 'size_mb': round(os.path.getsize(path) / 1e6, 1),
+            'rows': n_readings(days, interval), 'streamed': streamed,
+            'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()}}
+
+
+def end_to_end(file, case_parameters):
+
+    data = file_validation(file, case_parameters)
+    data, case_parameters = data_processing(data, case_parameters)
+    data, results = data_analysis(data, case_parameters)
+    plot_all(data, results, preview_dpi)
+
+    case_parameters = {key: value.isoformat() if isinstance(value, (datetime, pd.Timestamp)) else value
+                       for key, value in case_parameters.items()}
+    export_word(case_parameters, results, plot_individual(data, results)).save(io.BytesIO())
+
+
+def compare(case, baseline):
+
+    regressions = []
+
+    for stage in stages:
+        if stage not in case['timings']:
+            continue
+
+        seconds = case['timings'][stage]
+        line = f'    {stage:<18} {seconds:9.3f} s'
+        reference = baseline and baseline['timings'].get(stage)
+
+        if reference:
+            ratio = seconds / reference
+            slower = ratio > regression_factor and seconds - reference > noise_floor
+            line += f'   baseline {reference:9.3f} s   {ratio:5.2f}x' + ('   REGRESSION' if slower else '')
+
+            if slower:
+                regressions.append(stage)
+
+        print(line)
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Time every pipeline stage on synthetic logger files and compare '
+                                                 'against the stored baseline.')
+    parser.add_argument('--profile', choices=list(profiles), default='quick',
+                        help='quick: 1 to 30 days, every date and file format and medium (minutes); '
+                             'full: 30 days to 1 year at 1 s (hours, GBs of generated files)')
+    parser.add_argument('--repeat', type=int, default=3, help='best of this many runs per stage')
+    parser.add_argument('--save-baseline', action='store_true', help='store these timings as the new baseline')
+    args = parser.parse_args()
+
+    # the report template is looked up relative to the backend directory
+    os.chdir(backend_dir)
+
+    baseline_path = os.path.join(baseline_dir, f'pipeline_{args.profile}.json')
+    baseline = {}
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = {case['file']: case for case in json.load(file)['cases']}
+
+    cases = []
+    regressions = 0
+
+    for case in profiles[args.profile]:
+        result = run_case(*case, repeat=args.repeat)
+        cases.append(result)
+
+        print(f"{result['file']} ({result['rows']} rows, {result['size_mb']} MB{', streamed' if result['streamed'] else ''})")
+        regressions += len(compare(result, baseline.get(result['file'])))
+
+    if args.save_baseline:
+        os.makedirs(baseline_dir, exist_ok=True)
+        with open(baseline_path, 'w') as file:
+            json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                       'machine': platform.machine(), 'cpu_count': os.cpu_count(), 'cases': cases}, file, indent=1)
+        print(f'baseline written to {baseline_path}')
+    elif baseline:
+        print(f'{regressions} stage(s) slower than {regression_factor}x the baseline')
+
+    sys.exit(1 if regressions and not args.save_baseline else 0)
+
+
+if __name__ == '__main__':
+    main()
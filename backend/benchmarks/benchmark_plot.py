@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmark_storage import analysed_data
+from utils.plot import plot_individual, plot_single, individual_plots
+
+results = {'trendline_parameters_P/T': (-1e-7, 0.0205), 'trendline_parameters_mass': (-4e-7, 0.069)}
+
+
+def benchmark(n_points, workers):
+
+    data = analysed_data(n_points)
+
+    slowest = 0
+    for plot_func in individual_plots():
+        start = time.perf_counter()
+        plot_single(plot_func, data, results)
+        slowest = max(slowest, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    plot_individual(data, results, workers=1)
+    serial = time.perf_counter() - start
+
+    plot_individual(data, results, workers=workers)  # starts the worker processes
+
+    start = time.perf_counter()
+    plot_individual(data, results, workers=workers)
+    parallel = time.perf_counter() - start
+
+    print(f'{n_points:>8} points | slowest panel {slowest:6.2f} s | serial {serial:6.2f} s | '
+          f'{workers} workers {parallel:6.2f} s ({serial/parallel:.1f}x)')
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    print(f'{os.cpu_count()} cores available')
+
+    for points in [4320, 43200, 525600]:
+        benchmark(points, workers)
@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.pyramid import build_pyramid, level_of_detail, pyramid_columns
+
+# (label, start, end) in hours since the start of the test, None for the whole test
+ranges = [('whole test', None, None), ('one day', 48, 72), ('one hour', 50, 51)]
+
+
+def analysed_data(days, seed=0):
+
+    rng = np.random.default_rng(seed)
+    n = days*1440 + 1
+    time_hours = np.arange(n) / 60 - 4
+
+    data = pd.DataFrame({'time': time_hours, 'include': time_hours >= 0,
+                         'count_period': np.where(time_hours >= 0, time_hours // 24 + 1, 0)})
+
+    for name in pyramid_columns:
+        data[name] = 1 + 1e-5*time_hours + rng.normal(0, 1e-4, n)
+
+    return data
+
+
+def main():
+
+    print('1-minute data, default points per response\n')
+    print(f"{'days':>5} {'rows':>8} | {'build':>8} {'pyramid':>8} | " + ' | '.join(f'{label:>18}' for label, *_ in ranges))
+
+    for days in [7, 30, 90, 365]:
+        data = analysed_data(days)
+
+        start = time.perf_counter()
+        pyramid = build_pyramid(data)
+        seconds_build = time.perf_counter() - start
+
+        responses = []
+        for label, range_start, range_end in ranges:
+            start = time.perf_counter()
+            detail = level_of_detail(pyramid, data, range_start, range_end)
+            seconds = time.perf_counter() - start
+            responses.append(f'{seconds*1000:>5.1f} ms {len(json.dumps(detail)) / 1024:>5.1f} kB')
+
+        print(f"{days:>5} {len(data):>8} | {seconds_build:>6.3f} s {pyramid['bytes'] / 1024**2:>5.1f} MB | "
+              + ' | '.join(responses))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.analysis import data_resampling
+from utils.metrics import start_memory, stop_memory
+
+periods = ['10s', '1min', '5min']
+
+
+def logger_data(rows, interval, seed=0):
+
+    # readings every interval seconds with a jitter, a few missing readings and a day without any
+    rng = np.random.default_rng(seed)
+    seconds = np.arange(rows) * interval + rng.uniform(0, interval / 2, rows)
+    seconds[rows // 2:] += 86400
+
+    pressure = 10 - 1e-7*seconds + rng.normal(0, 1e-3, rows)
+    pressure[rng.integers(0, rows, rows // 1000)] = np.nan
+
+    return pd.DataFrame({'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(seconds, 's'), 'pressure': pressure,
+                         'temperature': 20 + rng.normal(0, 0.1, rows)})
+
+
+def groupby_resampling(data, period):
+
+    # the resampling this engine replaced, kept here as the reference
+    keys = data['date'].dt.floor(period).rename('date_resampled')
+    return data.groupby(keys)[['pressure', 'temperature']].mean().reset_index()
+
+
+def best_of(repeat, func, *args):
+
+    seconds = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    return seconds, result
+
+
+def peak_memory(func, *args):
+
+    # the stages reset the peak themselves (metrics.instrument), start/stop_memory carry it over
+    tracemalloc.start()
+
+    try:
+        start = start_memory()
+        func(*args)
+        return stop_memory(start)
+    finally:
+        tracemalloc.stop()
+
+
+def main(rows, interval, repeat):
+
+    data = logger_data(rows, interval)
+    print(f'{rows} rows every {interval} s, best of {repeat}, peak memory allocated\n')
+    print(f"{'period':>7} {'buckets':>9} | {'groupby':>8} {'buckets':>8} {'speedup':>8} | {'interpolate':>11} | "
+          f"{'groupby':>8} {'buckets':>8} | {'max rel. difference':>20}")
+
+    for period in periods:
+        seconds_groupby, reference = best_of(repeat, groupby_resampling, data, period)
+        seconds_buckets, resampled = best_of(repeat, data_resampling, data, period)
+        seconds_interpolate, _ = best_of(repeat, data_resampling, data, period, 'interpolate')
+        memory_groupby, memory_buckets = [peak_memory(func, data, period) / 1024**2
+                                          for func in [groupby_resampling, data_resampling]]
+
+        if not np.array_equal(reference.date_resampled.to_numpy(), resampled.date_resampled.to_numpy()):
+            raise RuntimeError(f'the buckets of {period} differ from groupby')
+
+        difference = max(np.nanmax(np.abs(resampled[name] / reference[name] - 1)) for name in ['pressure', 'temperature'])
+
+        print(f'{period:>7} {len(resampled):>9} | {seconds_groupby:>6.3f} s {seconds_buckets:>6.3f} s '
+              f'{seconds_groupby / seconds_buckets:>7.1f}x | {seconds_interpolate:>9.3f} s | '
+              f'{memory_groupby:>5.0f} MB {memory_buckets:>5.0f} MB | {difference:>20.1e}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='integer bucket resampling against the groupby it replaced')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--interval', type=float, default=1, help='seconds between readings')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.rows, args.interval, args.repeat)
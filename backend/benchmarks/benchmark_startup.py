@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+warm_up_modes = ['lazy', 'import', 'background']
+steps = ['import', 'index', 'analysis', 'plot', 'export']
+
+
+def worker(path, form):
+
+    # a fresh worker process, timed from the import of the app to its first report, nothing else is imported before it
+    timings = {}
+    start = time.perf_counter()
+
+    import app
+
+    timings['import'] = time.perf_counter() - start
+    client = app.app.test_client()
+
+    for step, send in [('index', lambda: client.get('/')),
+                       ('analysis', lambda: client.post('/analysis', data={**form, 'file': (open(path, 'rb'), 'data.csv')},
+                                                        content_type='multipart/form-data')),
+                       ('plot', lambda: client.get('/plot')),
+                       ('export', lambda: client.get('/export'))]:
+        step_start = time.perf_counter()
+        response = send()
+        timings[step] = time.perf_counter() - step_start
+
+        if response.status_code != 200:
+            raise RuntimeError(f'{step} returned {response.status_code}')
+
+    timings['ready'] = timings['import'] + timings['index']
+    timings['first_report'] = time.perf_counter() - start
+
+    print(json.dumps(timings))
+
+
+def run_worker(mode, path):
+
+    form = {**parameters, 'system_name': 'benchmark', 'format_date': 'simex', 'medium': 'nitrogen'}
+    env = {**os.environ, 'WARM_UP': mode, 'APP_ENV': 'local'}
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', path, json.dumps(form)],
+                            cwd=backend_dir, env=env, capture_output=True, text=True, check=True).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(repeat):
+
+    path = logger_file(data_dir, 7, 60, 'simex', 'nitrogen', 'csv')
+
+    # the first process loads the modules from disk, the ones timed find them in the page cache like a restarted worker
+    run_worker('lazy', path)
+
+    print(f'median of {repeat} worker processes, 7 days of 1-minute data\n')
+    print(f"{'warm up':>10} | " + ' '.join(f'{step:>8}' for step in steps) + f" | {'ready':>8} {'report':>8}")
+
+    for mode in warm_up_modes:
+        runs = [run_worker(mode, path) for _ in range(repeat)]
+        median = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+
+        print(f'{mode:>10} | ' + ' '.join(f'{median[step]:>6.3f} s' for step in steps)
+              + f" | {median['ready']:>6.3f} s {median['first_report']:>6.3f} s")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, backend_dir)
+    os.chdir(backend_dir)
+
+    parser = argparse.ArgumentParser(description='import time and first request latency of a new worker process')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--worker', nargs=2, metavar=('PATH', 'FORM'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker[0], json.loads(args.worker[1]))
+    else:
+        from generate_data import logger_file, parameters
+        from benchmark_pipeline import data_dir
+
+        main(args.repeat)
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.storage import save_session, load_session, load_data
+
+
+def analysed_data(n_points):
+
+    time_hours = np.arange(n_points) / 60
+    temperature = 20 + 2*np.sin(2*np.pi*time_hours/24)
+    pressure = 5*(temperature + 273.15)/293.15
+
+    data = pd.DataFrame({
+        'date_resampled': pd.date_range('2024-01-01', periods=n_points, freq='1min'),
+        'pressure': pressure,
+        'temperature': temperature,
+        'time': time_hours,
+        'include': time_hours <= time_hours[-1] // 24 * 24,
+        'count_period': time_hours // 24 + 1,
+        'P/T': pressure / (temperature + 273.15),
+    })
+    data['trendline_P/T'] = data['P/T'].mean() - 1e-7*time_hours
+    data['density'] = data['P/T'] * 1e5 / 296.8
+    data['mass'] = data['density'] * 0.01
+    data['trendline_mass'] = data['mass'].mean() - 4e-7*time_hours
+
+    return data
+
+
+def benchmark(n_points, directory):
+
+    data = analysed_data(n_points)
+    parameters = {'system_name': 'benchmark', 'medium': 'nitrogen'}
+    results = {'mass_rate': 4, 'trendline_parameters_P/T': (-1e-7, 0.02)}
+
+    start = time.perf_counter()
+    with tempfile.NamedTemporaryFile(delete=False, dir=directory, mode='w') as file:
+        file.write(data.to_json())
+    json_write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pd.read_json(file.name)
+    json_read = time.perf_counter() - start
+    json_size = os.path.getsize(file.name)
+    os.remove(file.name)
+
+    start = time.perf_counter()
+    path = save_session(directory, data, parameters, results)
+    store_write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_session(path)
+    stored = load_data(path)
+    store_read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for column in stored.columns:
+        stored[column].to_numpy().view(np.uint8).sum()
+    store_touch = time.perf_counter() - start
+
+    store_size = os.path.getsize(path)
+    os.remove(path)
+
+    print(f'{n_points:>8} rows | json: write {json_write:7.3f} s, read {json_read:7.3f} s, {json_size/1e6:7.1f} MB | '
+          f'store: write {store_write:7.4f} s, read {store_read:7.4f} s (+{store_touch:.4f} s touching all columns), '
+          f'{store_size/1e6:6.1f} MB')
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for rows in [1440, 43200, 525600]:
+            benchmark(rows, temp_dir)
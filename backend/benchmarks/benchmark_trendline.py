@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.analysis import calculate_trendline, calculate_period_trendlines, calculate_mass_rate
+
+leak_rate = 20  # grams/year
+spike_fraction = 0.001  # readings replaced by a transmitter spike
+dropout_minutes = 60  # readings of one logger dropout, read as zero
+
+
+def mass_data(days, seed=0):
+
+    rng = np.random.default_rng(seed)
+    n = days*1440 + 1
+
+    time_hours = np.arange(n) / 60
+    mass = 2 - leak_rate / 1000 / 24 / 365.25 * time_hours + rng.normal(0, 1e-5, n)
+
+    spikes = rng.choice(n, int(n*spike_fraction), replace=False)
+    mass[spikes] += rng.choice([-1, 1], len(spikes)) * rng.uniform(1e-3, 1e-2, len(spikes))
+
+    dropout = rng.integers(0, n - dropout_minutes)
+    mass[dropout:dropout + dropout_minutes] = 0
+
+    return pd.DataFrame({'time': time_hours, 'include': True, 'count_period': time_hours // 24 + 1, 'mass': mass})
+
+
+def timed(func, *args, repeat=3):
+
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def main():
+
+    print(f'1-minute mass data leaking {leak_rate} grams/year, with {spike_fraction:.1%} spikes and a '
+          f'{dropout_minutes} minute dropout\n')
+    print(f"{'days':>5} {'rows':>8} | {'least squares':>13} {'huber':>8} {'per period':>10} | "
+          f"{'rate least squares':>18} {'rate huber':>10}")
+
+    for days in [1, 7, 30, 90, 365]:
+        data = mass_data(days)
+
+        seconds_ols, (_, (slope_ols, _)) = timed(calculate_trendline, data, 'mass')
+        seconds_huber, (_, (slope_huber, _)) = timed(calculate_trendline, data, 'mass', 'huber')
+        seconds_periods, _ = timed(calculate_period_trendlines, data, 'mass', 'huber')
+
+        print(f'{days:>5} {len(data):>8} | {seconds_ols:>11.3f} s {seconds_huber:>6.3f} s {seconds_periods:>8.3f} s | '
+              f'{calculate_mass_rate(slope_ols):>12} g/year {calculate_mass_rate(slope_huber):>4} g/year')
+
+
+if __name__ == '__main__':
+    main()
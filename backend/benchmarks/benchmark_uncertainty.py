@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, backend_dir)
+
+from generate_data import logger_file, parameters
+from benchmark_pipeline import upload, data_dir
+from utils.validation import file_validation, parameter_validation
+from utils.analysis import data_processing, data_analysis
+from utils.uncertainty import uncertainty_analysis, UNCERTAINTY_DRAWS
+
+
+def analysed(days, medium):
+
+    path = logger_file(data_dir, days, 60, 'simex', medium, 'csv')
+    case_parameters = parameter_validation({**parameters, 'system_name': 'benchmark', 'format_date': 'simex',
+                                            'medium': medium})
+
+    data, case_parameters = data_processing(file_validation(upload(path), case_parameters), case_parameters)
+    volume = case_parameters['volume'] / 1000
+
+    start = time.perf_counter()
+    data, results = data_analysis(data, case_parameters)
+
+    return data, case_parameters, volume, time.perf_counter() - start
+
+
+def main():
+
+    print(f'{UNCERTAINTY_DRAWS} draws of 1-minute data\n')
+    print(f"{'days':>5} {'medium':>12} | {'one analysis':>12} {'per draw (est.)':>15} | {'vectorized':>10}   "
+          f"mass rate 2.5/50/97.5 %")
+
+    for days, medium in [(7, 'nitrogen'), (30, 'nitrogen'), (30, 'CO2'), (30, 'forming gas')]:
+        data, case_parameters, volume, seconds_analysis = analysed(days, medium)
+
+        start = time.perf_counter()
+        uncertainty = uncertainty_analysis(data, case_parameters, volume)
+        seconds = time.perf_counter() - start
+
+        print(f'{days:>5} {medium:>12} | {seconds_analysis:>10.3f} s {seconds_analysis*UNCERTAINTY_DRAWS:>13.0f} s | '
+              f'{seconds:>8.2f} s   {uncertainty["mass_rate"]} g/year')
+
+
+if __name__ == '__main__':
+    os.chdir(backend_dir)
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+# date column as written by the supported loggers, see validation.parse_date_format
+date_formats = {
+    'simex': lambda dates: dates.dt.strftime('%d/%m/%Y %H:%M:%S'),
+    'scada': lambda dates: dates.dt.strftime('%Y/%m/%d %H:%M:%S.%f').str[:-3],
+    'unix': lambda dates: (dates - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1),
+    'xls': lambda dates: (dates - pd.Timestamp('1899-12-30')) / pd.Timedelta(days=1)
+}
+file_formats = ['csv', 'xlsx']
+excel_row_limit = 1048576
+overrun = 600  # seconds logged past the last full day, a test is stopped some time after its last period ends
+
+# fill pressure in bara per medium, ammonia condenses at 20 °C above ~8.5 bar
+fill_pressures = {'CO2': 10, 'argon': 10, 'forming gas': 5, 'air': 8, 'nitrogen': 5, 'krypton': 10, 'ammonia': 4}
+
+# the column layout the generated files are read with
+parameters = {'start_row': '1', 'col_date': '1', 'col_pressure': '3', 'col_temperature': '4', 'custom_format': '',
+              'unit_pressure': 'bara', 'unit_temperature': 'C', 'volume': '10', 'unit_volume': 'liter',
+              'start_time': '', 'end_time': ''}
+
+
+def logger_data(days, interval, medium='nitrogen', leak_rate=2e-5, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    dates = pd.date_range('2024-03-01 08:00:17', periods=n_readings(days, interval), freq=pd.Timedelta(seconds=interval))
+    hours = (dates - dates[0]).total_seconds().to_numpy() / 3600
+
+    # daily temperature cycle, a filling transient over the first hours and a slow linear leak
+    temperature = 20 + 2*np.sin(2*np.pi*hours/24) + 1.5*np.exp(-hours/2) + rng.normal(0, 0.05, len(dates))
+    pressure = (fill_pressures[medium] * (temperature + 273.15) / 293.15 * (1 - leak_rate*hours)
+                + rng.normal(0, 0.001, len(dates)))
+
+    return pd.DataFrame({'date': dates, 'status': 1, 'pressure': pressure.round(5), 'temperature': temperature.round(3)})
+
+
+def n_readings(days, interval):
+    return int((days*86400 + overrun) / interval) + 1
+
+
+def write_logger_file(path, days, interval, date_format='simex', medium='nitrogen', seed=0):
+
+    file_format = path.rsplit('.')[-1].lower()
+
+    if file_format not in file_formats:
+        raise ValueError(f'file format not in list of available formats: {file_formats}')
+
+    if file_format == 'xlsx' and n_readings(days, interval) >= excel_row_limit:
+        raise ValueError(f'an excel sheet holds at most {excel_row_limit} rows')
+
+    data = logger_data(days, interval, medium, seed=seed)
+    data['date'] = date_formats[date_format](data.date)
+    data.columns = ['Date', 'Status', 'Pressure [bar]', 'Temperature [°C]']
+
+    if file_format == 'csv':
+        data.to_csv(path, index=False)
+    else:
+        data.to_excel(path, index=False)
+
+    return path
+
+
+def logger_file(directory, days, interval, date_format='simex', medium='nitrogen', file_format='csv'):
+
+    # generated files are kept, the long ones take minutes to write
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"logger_{days}d_{interval}s_{date_format}_{medium.replace(' ', '_')}.{file_format}")
+
+    if not os.path.exists(path):
+        write_logger_file(path + '.part.' + file_format, days, interval, date_format, medium)
+        os.replace(path + '.part.' + file_format, path)
+
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic pressure decay logger file.')
+    parser.add_argument('path', help='output file (.csv or .xlsx)')
+    parser.add_argument('--days', type=float, default=3)
+    parser.add_argument('--interval', type=float, default=10, help='seconds between readings')
+    parser.add_argument('--date-format', choices=list(date_formats), default='simex')
+    parser.add_argument('--medium', choices=list(fill_pressures), default='nitrogen')
+    args = parser.parse_args()
+
+    write_logger_file(args.path, args.days, args.interval, args.date_format, args.medium)
+    print(f'{args.path}: {os.path.getsize(args.path)/1e6:.1f} MB', file=sys.stderr)
@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# the tests import the backend modules the way app.py does, from the backend directory
+sys.path.insert(0, backend_dir)
+
+from utils.validation import parameter_validation
+from utils.analysis import data_resampling, data_processing, data_analysis
+
+
+@pytest.fixture
+def backend(monkeypatch):
+
+    # the app, its templates and temporary directory and the density tables are looked up relative to the backend
+    # directory
+    monkeypatch.chdir(backend_dir)
+
+    return backend_dir
+
+
+@pytest.fixture
+def parameters():
+
+    # the fields of the web form, as it sends them, for the synthetic data of analysed_data
+    return {'system_name': 'test', 'start_row': '1', 'col_date': '1', 'col_pressure': '2', 'col_temperature': '3',
+            'format_date': 'simex', 'custom_format': '', 'unit_pressure': 'bara', 'unit_temperature': 'C',
+            'volume': '10', 'unit_volume': 'liter', 'medium': 'nitrogen', 'start_time': '', 'end_time': ''}
+
+
+@pytest.fixture
+def analysed_data(backend, parameters):
+
+    # a test of 1-minute readings from 2024-01-01 with a steady pressure decay and a slow temperature swing, analysed
+    # as an upload with the form parameters and any changed ones, the pressure cells of the missing minutes left blank.
+    # Returns the data, the parameters and the results
+    def analyse(days=2, pressure=5, rate=1e-6, missing=(), **changed):
+
+        n = days*1440
+        data = pd.DataFrame({'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n), 'min'),
+                             'pressure': pressure - rate*np.arange(n), 'temperature': 20 + np.sin(np.arange(n) / 200)})
+        data.loc[list(missing), 'pressure'] = np.nan
+        data, processed = data_processing(data_resampling(data), parameter_validation({**parameters, **changed}))
+        data, results = data_analysis(data, processed)
+
+        return data, processed, results
+
+    return analyse
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.analysis import (t_quantile, calculate_period_trendlines, calculate_trendline, data_resampling,
+                            interpolation_limit)
+from utils.cache import cache_key
+from utils.validation import parameter_validation
+
+parsing_parameters = ['start_row', 'col_date', 'col_pressure', 'col_temperature', 'format_date', 'custom_format',
+                      'resample_period', 'resample_gaps']
+
+
+@pytest.mark.parametrize('dof, expected', [(1, 12.7062), (2, 4.3027), (4, 2.7764), (30, 2.0423), (60, 2.0003),
+                                           (1000, 1.9623)])
+def test_t_quantile(dof, expected):
+    assert t_quantile(dof) == pytest.approx(expected, abs=1e-4)
+
+
+def test_t_quantile_per_period():
+    assert np.allclose(t_quantile(np.array([1, 3, 120])), [12.7062, 3.1824, 1.9799], atol=1e-4)
+
+
+def analysis_keys(parameters, **changed):
+
+    # the keys of a finished analysis and of the parsed, resampled upload, as in app.analyse_upload
+    validated = parameter_validation({**parameters, **changed})
+
+    return (cache_key('hash', validated, exclude=['system_name']),
+            cache_key('hash', validated, names=parsing_parameters))
+
+
+@pytest.mark.parametrize('changed, analysis_changes, parsing_changes', [
+    ({'system_name': 'other'}, False, False),
+    ({'volume': '10.0'}, False, False),
+    ({'volume': '11'}, True, False),
+    ({'medium': 'argon'}, True, False),
+    ({'start_time': '2024-01-01T10:00'}, True, False),
+    ({'trendline_method': 'huber'}, True, False),
+    ({'uncertainty': 'checked'}, True, False),
+    ({'accuracy_pressure': '0.2', 'uncertainty': 'checked'}, True, False),
+    ({'start_row': '2'}, True, True),
+    ({'format_date': 'xls'}, True, True),
+    ({'resample_period': '5min'}, True, True),
+    ({'resample_gaps': 'interpolate'}, True, True)])
+def test_cache_key_follows_the_parameters(parameters, changed, analysis_changes, parsing_changes):
+
+    analysis_key, parsing_key = analysis_keys(parameters)
+    changed_analysis_key, changed_parsing_key = analysis_keys(parameters, **changed)
+
+    assert (changed_analysis_key != analysis_key) == analysis_changes
+    assert (changed_parsing_key != parsing_key) == parsing_changes
+    assert cache_key('other hash', parameter_validation(parameters), exclude=['system_name']) != analysis_key
+
+
+def periods_frame(counts=(1440, 1440, 4), seed=0):
+
+    # 1-minute rows of 24-hour periods, the last one only a few minutes long (a custom end time just past a period)
+    rng = np.random.default_rng(seed)
+    time = np.arange(sum(counts)) / 60
+    period = np.repeat(np.arange(1, len(counts) + 1), counts)
+    slopes = np.array([-1e-5, -3e-5, 2e-5])[period - 1]
+
+    return pd.DataFrame({'time': time, 'include': True, 'count_period': period,
+                         'mass': 1 + slopes*time + rng.normal(0, 1e-5, len(time))})
+
+
+def test_period_trendlines_match_polyfit():
+
+    data = periods_frame()
+    fit = calculate_period_trendlines(data, 'mass')
+
+    assert list(fit['period']) == [1, 2, 3]
+    assert list(fit['n']) == [1440, 1440, 4]
+
+    for i, period in enumerate(fit['period']):
+        rows = data[data.count_period == period]
+        (slope, intercept), covariance = np.polyfit(rows.time, rows.mass, 1, cov=True)
+
+        assert fit['slope'][i] == pytest.approx(slope, rel=1e-9)
+        assert fit['intercept'][i] == pytest.approx(intercept, rel=1e-9)
+        assert fit['standard_error'][i] == pytest.approx(np.sqrt(covariance[0, 0]), rel=1e-6)
+        assert (fit['start_time'][i], fit['end_time'][i]) == (rows.time.iloc[0], rows.time.iloc[-1])
+
+
+def test_periods_of_two_points_are_left_out():
+
+    fit = calculate_period_trendlines(periods_frame(counts=(1440, 2)), 'mass')
+
+    assert list(fit['period']) == [1]
+
+
+def spiky_frame(seed=0):
+
+    # two days of 1-minute P/T with noise, 2 % of the readings spiking upwards and a logger dropout to zero late in the test
+    rng = np.random.default_rng(seed)
+    time = np.arange(2*1440) / 60
+    values = 0.017 - 2e-6*time + rng.normal(0, 1e-6, len(time))
+    spikes = rng.choice(len(time), len(time) // 50, replace=False)
+    values[spikes] += 5e-4
+    values[2600:2640] = 0
+
+    return pd.DataFrame({'time': time, 'include': True, 'count_period': time // 24 + 1, 'P/T': values})
+
+
+def test_huber_trendline_recovers_the_slope():
+
+    data = spiky_frame()
+    _, (slope, _) = calculate_trendline(data, 'P/T', 'huber')
+    _, (least_squares_slope, _) = calculate_trendline(data, 'P/T')
+
+    assert slope == pytest.approx(-2e-6, rel=0.02)
+    assert abs(least_squares_slope / -2e-6 - 1) > 0.5
+
+
+def test_huber_period_trendlines_recover_the_slope():
+
+    fit = calculate_period_trendlines(spiky_frame(), 'P/T', 'huber')
+
+    assert fit['slope'] == pytest.approx([-2e-6, -2e-6], rel=0.05)
+
+
+def gappy_readings():
+
+    # readings every 20 seconds over 5 hours, the logger missing 10 minutes and, later, 2 hours, the pressure falling
+    # linearly and the temperature reading lost for one whole minute
+    seconds = np.arange(0, 5*3600, 20)
+    seconds = seconds[((seconds < 3600) | (seconds >= 3600 + 600)) & ((seconds < 2*3600) | (seconds >= 4*3600))]
+    temperature = np.full(len(seconds), 20.0)
+    temperature[(seconds >= 30*60) & (seconds < 31*60)] = np.nan
+
+    return pd.DataFrame({'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(seconds, 's'),
+                         'pressure': 5 - 1e-5*seconds, 'temperature': temperature})
+
+
+def test_gaps_are_dropped():
+
+    data = data_resampling(gappy_readings(), '1min', 'drop')
+    minutes = (data.date_resampled - pd.Timestamp('2024-01-01')).dt.total_seconds().to_numpy() // 60
+
+    assert len(data) == 300 - 10 - 120
+    assert not np.isin(minutes, np.r_[60:70, 120:240]).any()
+    assert data.attrs['gaps'] == {'period': '1min', 'missing': 130, 'interpolated': 0}
+
+    # a bucket with readings but without a temperature keeps its row
+    assert np.isnan(data.temperature.to_numpy()[minutes == 30]).all()
+    assert data.pressure.to_numpy()[minutes == 30] == pytest.approx(5 - 1e-5*(30*60 + 20))
+
+
+def test_short_gaps_are_interpolated():
+
+    data = data_resampling(gappy_readings(), '1min', 'interpolate')
+    minutes = (data.date_resampled - pd.Timestamp('2024-01-01')).dt.total_seconds().to_numpy() // 60
+
+    # the 10-minute gap is filled in linearly, the 2-hour one is longer than the limit and left out
+    assert interpolation_limit < 120
+    assert len(data) == 300 - 120
+    assert np.isin(np.arange(60, 70), minutes).all()
+    assert not np.isin(minutes, np.r_[120:240]).any()
+    assert data.attrs['gaps'] == {'period': '1min', 'missing': 130, 'interpolated': 10}
+
+    assert data.pressure.to_numpy() == pytest.approx(5 - 1e-5*(minutes*60 + 20))
+    assert np.diff(data.date_resampled.to_numpy()).min() == np.timedelta64(1, 'm')
+
+
+def test_unknown_gap_handling():
+    with pytest.raises(ValueError, match='gap handling'):
+        data_resampling(gappy_readings(), '1min', 'nearest')
+
+
+def test_a_missing_reading_is_left_out_of_both_trendlines(analysed_data):
+
+    data, _, results = analysed_data(missing=[600])
+    _, _, complete = analysed_data()
+
+    # the minute without a pressure is dropped before the P/T and the mass trendlines are fitted
+    assert len(data) == 2*1440 - 1 and data['P/T'].notna().all()
+    assert np.isfinite(results['trendline_parameters_P/T']).all()
+    assert results['ideal_gas_rate'] == pytest.approx(complete['ideal_gas_rate'], rel=0.01)
+    assert results['mass_rate'] == pytest.approx(complete['mass_rate'], rel=0.01)
@@ -0,0 +1,148 @@
+import io
+import os
+import re
+import pandas as pd
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from utils.figures import FigureCache
+from utils.storage import save_session
+
+
+@pytest.fixture
+def client(backend, monkeypatch):
+
+    import app
+    monkeypatch.setattr(app, 'RESAMPLE_PERIOD', '5min')
+
+    return app.app.test_client()
+
+
+def test_form_preselects_the_configured_resampling_period(client):
+
+    html = client.get('/').get_data(as_text=True)
+    select = re.search(r'<select name="resample_period">(.*?)</select>', html, re.S).group(1)
+
+    assert re.findall(r'option value="(\w+)" selected', select) == ['5min']
+
+
+def test_live_test_skips_a_missing_reading(client):
+
+    response = client.post('/live', json={'system_name': 'test', 'unit_pressure': 'bara', 'unit_temperature': 'C',
+                                          'volume': 10, 'unit_volume': 'liter', 'medium': 'nitrogen'})
+    readings_url, status_url = response.json['readings_url'], response.json['status_url']
+
+    # one reading a minute from 2024-01-01 (unix seconds), the logger lost the pressure of one of them
+    start = 1704067200
+    readings = [[start + 60*i, 5 - 1e-4*i, 20] for i in range(120)]
+    readings[30][1] = None
+
+    assert client.post(readings_url, json={'readings': readings[:60]}).status_code == 200
+    assert client.post(readings_url, json={'readings': readings[60:]}).status_code == 200
+
+    status = client.get(status_url)
+
+    assert status.status_code == 200
+    assert status.json['readings'] == 120
+    assert status.json['running_results']['ideal_gas_rate'] > 0
+
+
+
+def test_live_test_matches_the_upload(client, parameters):
+
+    import app
+
+    # two days of readings, pushed to a live test and uploaded as a file
+    start = 1704067200
+    readings = [[start + 60*i, 5 - 1e-6*i, 20] for i in range(2*1440)]
+
+    response = client.post('/live', json={'system_name': 'test', 'unit_pressure': 'bara', 'unit_temperature': 'C',
+                                          'volume': 10, 'unit_volume': 'liter', 'medium': 'nitrogen'})
+    client.post(response.json['readings_url'], json={'readings': readings})
+    live = client.get(response.json['status_url']).json['results']
+
+    upload = 'date,pressure,temperature\n' + ''.join(f'{pd.Timestamp(date, unit="s"):%d/%m/%Y %H:%M:%S},{pressure},'
+                                                      f'{temperature}\n' for date, pressure, temperature in readings)
+    outcome = app.analyse_upload(FileStorage(io.BytesIO(upload.encode()), filename='data.csv'), parameters)
+    app.temp_store.remove(outcome['session_path'])
+
+    for key in ['periods', 'total_test_time', 'ideal_gas_rate', 'mass_rate', 'bubble_rate']:
+        assert live[key] == outcome['results'][key]
+
+    assert type(live['periods']) is type(outcome['results']['periods']) is int
+
+
+def saved_analysis(app, directory, analysed_data):
+
+    data, parameters, results = analysed_data()
+    parameters = {key: value.isoformat() if isinstance(value, pd.Timestamp) else value
+                  for key, value in parameters.items()}
+
+    session_path = save_session(str(directory), data, parameters, results)
+    app.temp_store.add(session_path, 'session')
+
+    return {'analysis_id': os.path.basename(session_path), 'session_path': session_path, 'system_name': 'test'}
+
+
+def test_bulk_report_tells_a_failed_render_from_a_missing_file(client, analysed_data, monkeypatch, tmp_path):
+
+    import app
+
+    def broken_render(*args, **kwargs):
+        raise ValueError('ParseException')
+
+    entry = saved_analysis(app, tmp_path, analysed_data)
+    monkeypatch.setattr(app, 'plot_panels', broken_render)
+
+    with pytest.raises(RuntimeError, match='test: the report plots cannot be rendered'):
+        app.bulk_report(entry)
+
+    app.temp_store.remove(entry['session_path'])
+
+    with pytest.raises(FileNotFoundError, match='test: data file cannot be read'):
+        app.bulk_report(entry)
+
+
+class QueuedExecutor:
+
+    # stands in for figure_executor, the submitted pre-renders stay queued until the test runs them
+    def __init__(self):
+        self.queued = []
+
+    def submit(self, fn, *args):
+        self.queued.append((fn, args))
+
+
+def test_a_pending_prerender_is_queued_once(client, parameters, monkeypatch, tmp_path):
+
+    import app
+
+    executor = QueuedExecutor()
+    monkeypatch.setattr(app, 'figure_executor', executor)
+    monkeypatch.setattr(app, 'figure_cache', FigureCache(str(tmp_path), max_bytes=2**20, max_disk_bytes=2**20))
+    monkeypatch.setattr(app, 'plot_all', lambda data, results, dpi: io.BytesIO(b'overview'))
+    monkeypatch.setattr(app, 'plot_panels', lambda plots, data, results: [io.BytesIO(b'panel') for _ in plots])
+
+    # two days of 1-minute readings uploaded three times while the figure thread is busy
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(range(2*1440), 'min')
+    upload = 'date,pressure,temperature\n' + ''.join(f'{date:%d/%m/%Y %H:%M:%S},{5 - 1e-6*i},20\n'
+                                                      for i, date in enumerate(dates))
+    outcomes = [app.analyse_upload(FileStorage(io.BytesIO(upload.encode()), filename='data.csv'), parameters)
+                for _ in range(3)]
+    analysis_id = outcomes[0]['analysis_id']
+
+    # the queue holds the analysis id, not the analysed data, and renders from the latest session file
+    assert executor.queued == [(app.render_figures, (analysis_id,))]
+    assert app.prerender_pending[analysis_id] == outcomes[-1]['session_path']
+
+    for outcome in outcomes[:-1]:
+        app.temp_store.remove(outcome['session_path'])
+
+    fn, args = executor.queued[0]
+    fn(*args)
+
+    assert analysis_id not in app.prerender_pending
+    assert app.figure_cache.get(analysis_id, 'overview', lambda: pytest.fail('rendered again')) == b'overview'
+    assert app.pyramid_cache.get(analysis_id) is not None
+
+    app.temp_store.remove(outcomes[-1]['session_path'])
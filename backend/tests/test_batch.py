@@ -0,0 +1,71 @@
+import os
+import json
+
+import batch
+from batch import report_names, run_batch
+
+
+def test_report_names_are_unique():
+
+    names = ['site_a/sys1.csv', 'site_b/sys1.csv', 'site_a/sys 1.csv', 'site_a/sys1.xlsx', 'sys1.csv']
+    reports = report_names(names)
+
+    assert len(set(reports)) == len(names)
+    assert [report.split('_pressure-decay-test_')[1] for report in reports] == [
+        'site_a_sys1.docx', 'site_b_sys1.docx', 'site_a_sys_1.docx', 'site_a_sys1_2.docx', 'sys1.docx']
+
+
+def crashing_analysis(path, member, name, raw_parameters, report_dir, report_name=None):
+
+    # a worker killed while analysing the file (out of memory)
+    if name.startswith('crash'):
+        os._exit(1)
+
+    return {'file': name, 'report': '', 'status': 'ok', 'error': ''}
+
+
+def test_a_killed_worker_does_not_stop_the_batch(tmp_path, monkeypatch):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+    for name in ['a.csv', 'b.csv', 'crash.csv', 'c.csv', 'd.csv', 'e.csv']:
+        (source / name).write_text('')
+    (tmp_path / 'parameters.json').write_text(json.dumps({}))
+
+    monkeypatch.setattr(batch, 'analyse_file', crashing_analysis)
+    summary = run_batch(str(source), str(tmp_path / 'parameters.json'), str(tmp_path / 'summary.csv'), workers=2)
+
+    assert len(summary) == 6
+    assert dict(zip(summary.file, summary.status)) == {'a.csv': 'ok', 'b.csv': 'ok', 'c.csv': 'ok', 'crash.csv': 'failed',
+                                                       'd.csv': 'ok', 'e.csv': 'ok'}
+    assert 'killed' in summary.set_index('file').error['crash.csv']
+
+
+class RefillBreaksPool(batch.ProcessPoolExecutor):
+
+    # the first pool has a worker die between the wait for a file and the refill, the pool refuses the next file
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        RefillBreaksPool.submitted += 1
+        if RefillBreaksPool.submitted == 3:
+            raise batch.BrokenProcessPool('a worker died since the last wait')
+        return super().submit(*args, **kwargs)
+
+
+def test_a_pool_broken_during_the_refill_does_not_stop_the_batch(tmp_path, monkeypatch):
+
+    source = tmp_path / 'source'
+    source.mkdir()
+    for name in ['a.csv', 'b.csv', 'c.csv', 'd.csv', 'e.csv']:
+        (source / name).write_text('')
+    (tmp_path / 'parameters.json').write_text(json.dumps({}))
+
+    monkeypatch.setattr(batch, 'analyse_file', crashing_analysis)
+    monkeypatch.setattr(batch, 'ProcessPoolExecutor', RefillBreaksPool)
+    monkeypatch.setattr(RefillBreaksPool, 'submitted', 0)
+    summary = run_batch(str(source), str(tmp_path / 'parameters.json'), str(tmp_path / 'summary.csv'), workers=2)
+
+    assert RefillBreaksPool.submitted > 3
+    assert sorted(summary.file) == ['a.csv', 'b.csv', 'c.csv', 'd.csv', 'e.csv']
+    assert (summary.status == 'ok').all()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import dates
+from utils.dates import parse_date_format, detect_date_format
+
+
+@pytest.fixture(autouse=True)
+def detected_formats(monkeypatch):
+
+    # every test starts without a format remembered from an earlier upload
+    monkeypatch.setattr(dates, '_detected_formats', {})
+
+
+def simex_dates(start, days):
+    return pd.Series((pd.Timestamp(start) + pd.to_timedelta(np.arange(days), 'D')).strftime('%d/%m/%Y %H:%M:%S'))
+
+
+def test_declared_format_wins_over_a_remembered_one():
+
+    # a month first file stores its format, a later day first file that also parses month first must not use it
+    month_first = pd.Series(['03/10/2024 12:00:00', '03/11/2024 12:00:00', '03/25/2024 12:00:00'])
+    assert parse_date_format(month_first, 'simex').iloc[-1] == pd.Timestamp('2024-03-25 12:00')
+
+    day_first = simex_dates('2024-03-01', 9)
+    parsed = parse_date_format(day_first, 'simex')
+
+    assert (parsed == pd.date_range('2024-03-01', periods=9, freq='D')).all()
+
+
+def test_remembered_format_is_the_fallback():
+
+    month_first = pd.Series(['03/10/2024 12:00:00', '03/25/2024 12:00:00'])
+
+    assert detect_date_format(month_first, 'simex') == '%m/%d/%Y %H:%M:%S'
+    assert dates._detected_formats[('simex', None)] == '%m/%d/%Y %H:%M:%S'
+    assert detect_date_format(simex_dates('2024-03-01', 3), 'simex') == '%d/%m/%Y %H:%M:%S'
+
+
+@pytest.mark.parametrize('format_type, values, expected', [
+    ('simex', ['01/03/2024 10:00:00', '13/03/2024 10:00:01'], ['2024-03-01 10:00:00', '2024-03-13 10:00:01']),
+    ('scada', ['2024/03/01 10:00:00.250', '2024/03/13 10:00:01.500'],
+     ['2024-03-01 10:00:00.25', '2024-03-13 10:00:01.5']),
+    ('unix', ['1709287200', '1709287201.5'], ['2024-03-01 10:00:00', '2024-03-01 10:00:01.5']),
+    ('xls', ['45352.5', '45353'], ['2024-03-01 12:00:00', '2024-03-02 00:00:00']),
+])
+def test_logger_formats(format_type, values, expected):
+
+    parsed = parse_date_format(pd.Series(values), format_type)
+
+    assert list(parsed) == [pd.Timestamp(value) for value in expected]
+
+
+def test_custom_format():
+
+    parsed = parse_date_format(pd.Series(['2024.03.01-10h00', '2024.03.13-10h05']), 'custom', '%Y.%m.%d-%Hh%M')
+
+    assert list(parsed) == [pd.Timestamp('2024-03-01 10:00'), pd.Timestamp('2024-03-13 10:05')]
+
+
+def test_fixed_width_and_repeated_dates_match_pandas():
+
+    # seconds logged ten times each take the per distinct value path, a long column the fixed width one
+    values = simex_dates('2024-01-01', 400).repeat(10).reset_index(drop=True)
+
+    assert (parse_date_format(values, 'simex') == pd.to_datetime(values, format='%d/%m/%Y %H:%M:%S')).all()
+
+
+def test_unparsable_dates():
+
+    with pytest.raises(ValueError, match='could not be parsed'):
+        parse_date_format(pd.Series(['not a date', 'neither']), 'simex')
+
+    with pytest.raises(ValueError, match='not in list'):
+        parse_date_format(pd.Series(['01/03/2024 10:00:00']), 'unknown')
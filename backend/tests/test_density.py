@@ -0,0 +1,24 @@
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip('CoolProp')
+
+from utils import density
+
+
+def test_truncated_table_is_rebuilt(tmp_path, monkeypatch):
+
+    # a worker killed while writing the table left half a file behind
+    monkeypatch.setattr(density, 'TABLE_DIR', str(tmp_path))
+    table = density.load_table('nitrogen')
+    path = tmp_path / 'density_nitrogen.npz'
+    path.write_bytes(path.read_bytes()[:1000])
+
+    rebuilt = density.load_table('nitrogen')
+
+    assert np.array_equal(rebuilt['density'], table['density'])
+    assert os.listdir(tmp_path) == ['density_nitrogen.npz']
+
+    with np.load(path) as stored:
+        assert np.array_equal(stored['density'], table['density'])
@@ -0,0 +1,31 @@
+import io
+import threading
+
+from utils.figures import FigureCache
+
+
+def test_render_locks_are_dropped_after_the_render(tmp_path):
+
+    cache = FigureCache(str(tmp_path), max_bytes=1024**2, max_disk_bytes=1024**2)
+    started, release = threading.Event(), threading.Event()
+    renders = []
+
+    def render():
+        renders.append(1)
+        started.set()
+        release.wait(5)
+        return io.BytesIO(b'png')
+
+    # a second request for the same figure waits for the first render instead of repeating it
+    first = threading.Thread(target=cache.get, args=('analysis', 'overview', render))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=cache.get, args=('analysis', 'overview', render))
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+
+    assert len(renders) == 1
+    assert cache.get('analysis', 'overview', render) == b'png'
+    assert cache.render_locks == {}
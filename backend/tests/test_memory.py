@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(backend_dir, 'benchmarks'))
+
+from benchmark_memory import run_case, budgets
+
+
+@pytest.mark.parametrize('days, interval, medium', [(7, 10, 'nitrogen'), (30, 60, 'CO2')])
+def test_stages_stay_within_their_memory_budget(days, interval, medium, backend):
+
+    size, peaks = run_case(days, interval, medium)
+
+    for stage, peak in peaks.items():
+        assert peak / 1024**2 / size <= budgets[stage], f'{stage} peaked at {peak / 1024**2:.1f} MB for {size:.1f} MB'
@@ -0,0 +1,33 @@
+import numpy as np
+
+from utils import metrics
+
+
+def test_exposition_keeps_every_digit(monkeypatch):
+
+    monkeypatch.setattr(metrics, '_collectors', [lambda: [
+        ('test_cache_bytes', 'gauge', 'bytes', {'cache="figure"': 268435456, 'cache="pyramid"': np.int64(1000001)}),
+        ('test_seconds', 'counter', 'seconds', {'': 1234567.125})]])
+
+    lines = metrics.exposition().splitlines()
+
+    assert 'test_cache_bytes{cache="figure"} 268435456' in lines
+    assert 'test_cache_bytes{cache="pyramid"} 1000001' in lines
+    assert 'test_seconds 1234567.125' in lines
+
+
+def test_histogram_sum():
+
+    histogram = metrics.Histogram('test_stage_rows', 'rows', [10, 100], 'stage')
+    histogram.observe('stage', 12345678.5)
+
+    assert 'test_stage_rows_sum{stage="stage"} 12345678.5' in histogram.exposition()
+
+
+def test_exposition_without_the_resource_module(monkeypatch):
+
+    # Windows: the metrics are served without the peak memory of the process
+    monkeypatch.setattr(metrics, 'resource', None)
+    monkeypatch.setattr(metrics, '_collectors', [])
+
+    assert 'max_rss' not in metrics.exposition()
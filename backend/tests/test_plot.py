@@ -0,0 +1,51 @@
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import plot
+
+
+def crash():
+    os._exit(1)
+
+
+@pytest.fixture
+def analysis(analysed_data):
+
+    data, _, results = analysed_data(days=3)
+
+    return data, results
+
+
+def test_broken_pool_is_replaced(analysis):
+
+    data, results = analysis
+    executor = plot.get_executor(2)
+
+    # a worker killed (out of memory) breaks the pool, the next render starts a new one
+    with pytest.raises(BrokenProcessPool):
+        executor.submit(crash).result()
+
+    images = plot.plot_panels(plot.individual_plots()[:2], data, results, dpi=20, workers=2)
+
+    assert [image.getvalue()[:4] for image in images] == [b'\x89PNG'] * 2
+    assert plot.get_executor(2) is not executor
+
+
+def test_two_analyses_render_at_once(analysis, analysed_data):
+
+    data, _, results = analysed_data(days=3, pressure=8, rate=3e-6)
+    other = data, results
+
+    # the web page overview of one analysis next to the in-process report panels of another, the trendline labels of
+    # both go through the mathtext parser
+    def render(i):
+        if i % 2:
+            return [plot.plot_all(*other, dpi=20)]
+        return plot.plot_panels(plot.individual_plots()[:2], *analysis, dpi=20, workers=1)
+
+    with ThreadPoolExecutor(4) as executor:
+        images = [image for result in executor.map(render, range(8)) for image in result]
+
+    assert [image.getvalue()[:4] for image in images] == [b'\x89PNG'] * 12
@@ -0,0 +1,42 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.pyramid import build_pyramid, level_of_detail, pyramid_columns
+
+
+@pytest.fixture
+def data():
+
+    # 30 days of 1-minute data with a single spike
+    rng = np.random.default_rng(0)
+    time_hours = np.arange(30*1440 + 1) / 60
+    data = pd.DataFrame({'time': time_hours, 'include': True, 'count_period': time_hours // 24 + 1})
+
+    for name in pyramid_columns:
+        data[name] = 1 + 1e-5*time_hours + rng.normal(0, 1e-4, len(data))
+
+    data.loc[20000, 'pressure'] = 2
+
+    return data
+
+
+def test_first_response_is_a_few_kilobytes(data):
+
+    detail = level_of_detail(build_pyramid(data), data)
+
+    assert len(json.dumps(detail)) < 10 * 1024
+    assert all(list(stats) == ['mean'] for stats in detail['columns'].values())
+
+
+def test_envelope_on_request(data):
+
+    detail = level_of_detail(build_pyramid(data), data, columns=['pressure', 'trendline_P/T'], stats=['min', 'max'])
+
+    assert list(detail['columns']['pressure']) == ['min', 'max']
+    assert list(detail['columns']['trendline_P/T']) == ['mean']
+    assert max(detail['columns']['pressure']['max']) == 2
+
+    with pytest.raises(ValueError, match='statistic'):
+        level_of_detail(build_pyramid(data), data, stats=['median'])
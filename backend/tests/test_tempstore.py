@@ -0,0 +1,55 @@
+import os
+import pytest
+
+from utils.tempstore import TempStore
+
+ttls = {'session': 3600, 'figure': 3600, 'upload': 3600, 'profile': 3600, 'other': 3600}
+
+
+def write(directory, filename, size):
+
+    path = os.path.join(directory, filename)
+    with open(path, 'wb') as file:
+        file.write(b'0' * size)
+
+    return path
+
+
+def test_files_of_another_worker_are_left_to_the_sweep(tmp_path):
+
+    # two worker processes sharing the directory, each with its own store
+    worker = TempStore(str(tmp_path), max_bytes=1000, ttls=ttls)
+    other = TempStore(str(tmp_path), max_bytes=1000, ttls=ttls)
+
+    theirs = write(tmp_path, 'theirs.store', 600)
+    other.add(theirs, 'session')
+
+    # over the quota together, but this process only evicts its own files
+    for i in range(3):
+        worker.add(write(tmp_path, f'upload_{i}', 400), 'upload')
+
+    assert os.path.isfile(theirs)
+    assert not os.path.isfile(tmp_path / 'upload_0')
+
+    # the sweep leaves it alone until it has not been touched for its TTL
+    worker.cleanup()
+    assert os.path.isfile(theirs)
+
+    os.utime(theirs, (0, 0))
+    worker.cleanup()
+    assert not os.path.isfile(theirs)
+
+
+def test_a_file_read_here_is_taken_over(tmp_path):
+
+    store = TempStore(str(tmp_path), max_bytes=1000, ttls=ttls)
+    path = write(tmp_path, 'theirs.store', 600)
+
+    with store.reading(path):
+        assert store.stats()['kinds'] == {'session': (1, 600)}
+
+    store.remove(path)
+
+    with pytest.raises(FileNotFoundError):
+        with store.reading(path):
+            pass
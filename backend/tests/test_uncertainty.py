@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from utils import uncertainty
+from utils.density import compute_density
+from utils.analysis import data_analysis
+
+
+@pytest.fixture
+def analysis(analysed_data, monkeypatch):
+
+    monkeypatch.setattr(uncertainty, 'UNCERTAINTY_DRAWS', 500)
+
+    return analysed_data(uncertainty='checked')
+
+
+def test_interval_holds_the_result(analysis):
+
+    _, _, results = analysis
+    low, median, high = results['uncertainty']['mass_rate']
+
+    assert results['uncertainty']['draws'] == 500
+    assert low < median < high
+    assert low <= results['mass_rate'] <= high
+
+
+def test_backward_difference_past_the_density_range(analysis, monkeypatch):
+
+    data, processed, results = analysis
+    limit = data.temperature.max() + 0.005
+
+    # no density just above the warmest reading, as at a saturation line, the temperature steps forward from it fail
+    def density_below(temperature, pressure, medium):
+        density = compute_density(temperature, pressure, medium)
+        density[np.asarray(temperature) > limit] = np.nan
+        return density
+
+    monkeypatch.setattr(uncertainty, 'compute_density', density_below)
+
+    assert uncertainty.uncertainty_analysis(data, processed, 0.01) == results['uncertainty']
+
+
+def test_unavailable_without_a_density_around_the_readings(analysis, monkeypatch):
+
+    data, processed, _ = analysis
+    monkeypatch.setattr(uncertainty, 'compute_density', lambda temperature, pressure, medium: np.full(len(pressure), np.nan))
+    results = data_analysis(data, processed)[1]
+
+    assert results['uncertainty'] is None
+    assert np.isfinite(results['mass_rate'])
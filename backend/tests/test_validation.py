@@ -0,0 +1,79 @@
+import re
+import zipfile
+import openpyxl
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from utils.validation import read_excel_columns, parameter_validation, stream_file
+
+columns = {'col_date': 1, 'col_pressure': 2, 'col_temperature': 3, 'start_row': 1}
+
+
+@pytest.fixture
+def workbook(tmp_path):
+
+    # 50 rows of 4 columns, saved once as written and once with a dimension that claims a single cell
+    book = openpyxl.Workbook()
+    for i in range(50):
+        book.active.append([f'01/03/2024 10:{i:02d}:00', 1.0 + i, 20.0, 'note' if i % 2 else None])
+    book.save(tmp_path / 'data.xlsx')
+
+    with zipfile.ZipFile(tmp_path / 'data.xlsx') as source, zipfile.ZipFile(tmp_path / 'dimension.xlsx', 'w') as target:
+        for item in source.infolist():
+            content = source.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                content = re.sub(rb'<dimension ref="[^"]*"/>', b'<dimension ref="A1"/>', content)
+            target.writestr(item, content)
+
+    return tmp_path
+
+
+def read(path, **parameters):
+    with open(path, 'rb') as stream:
+        return read_excel_columns(FileStorage(stream, filename=path.name), {**columns, **parameters})
+
+
+@pytest.mark.parametrize('name', ['data.xlsx', 'dimension.xlsx'])
+def test_rows_are_read_whatever_the_dimension(workbook, name):
+
+    data = read(workbook / name)
+
+    assert len(data) == 49
+    assert data.date.iloc[-1] == '01/03/2024 10:49:00'
+    assert data.pressure.iloc[-1] == 50.0
+
+
+@pytest.mark.parametrize('name', ['data.xlsx', 'dimension.xlsx'])
+def test_errors_come_from_the_rows(workbook, name):
+
+    with pytest.raises(ValueError, match='column number'):
+        read(workbook / name, col_temperature=5)
+
+    with pytest.raises(ValueError, match='header row'):
+        read(workbook / name, start_row=50)
+
+    assert len(read(workbook / name, col_date=4)) == 49
+
+
+@pytest.mark.parametrize('value, expected', [('checked', True), (True, True), (False, False), ('', False), (None, False)])
+def test_uncertainty_checkbox(parameters, value, expected):
+    assert parameter_validation({**parameters, 'uncertainty': value})['uncertainty'] is expected
+
+
+def test_uncertainty_left_out(parameters):
+    assert parameter_validation(parameters)['uncertainty'] is False
+
+
+@pytest.mark.parametrize('value, expected', [(0, 0.0), (0.0, 0.0), ('0', 0.0), ('0.3', 0.3), ('', 0.1), (None, 0.1)])
+def test_zero_accuracy_is_kept(parameters, value, expected):
+    assert parameter_validation({**parameters, 'accuracy_pressure': value})['accuracy_pressure'] == expected
+
+
+@pytest.mark.parametrize('changed, error', [({'start_row': '10'}, 'header row'), ({'col_temperature': '5'}, 'column number')])
+def test_streamed_csv_errors(tmp_path, parameters, changed, error):
+
+    (tmp_path / 'data.csv').write_text('date,pressure,temperature\n01/03/2024 10:00:00,1.0,20.0\n')
+
+    with open(tmp_path / 'data.csv', 'rb') as stream:
+        with pytest.raises(ValueError, match=error):
+            stream_file(FileStorage(stream, filename='data.csv'), parameter_validation({**parameters, **changed}))
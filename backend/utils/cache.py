@@ -0,0 +1,112 @@
+import json
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+import pandas as pd
+
+
+class LRUCache:
+
+    def __init__(self, max_bytes, max_entries=None, on_evict=None):
+
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return self.entries[key][0]
+
+    def put(self, key, value, size=None):
+
+        size = object_size(value) if size is None else size
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+            if size > self.max_bytes:
+                return
+
+            self.entries[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_bytes or (self.max_entries and len(self.entries) > self.max_entries):
+                evicted_key, (evicted_value, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+                if self.on_evict:
+                    self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key):
+
+        with self.lock:
+            if key in self.entries:
+                value, size = self.entries.pop(key)
+                self.size -= size
+                return value
+
+    def keys(self):
+
+        with self.lock:
+            return list(self.entries)
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+def object_size(value):
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    elif isinstance(value, (bytes, bytearray)):
+        return len(value)
+    elif isinstance(value, (tuple, list)):
+        return sum(object_size(item) for item in value)
+    elif isinstance(value, dict):
+        return len(json.dumps(value, default=str))
+    else:
+        return 64
+
+
+def file_hash(file):
+
+    if not file or file.filename == '':
+        return None
+
+    digest = hashlib.sha256()
+
+    for block in iter(lambda: file.stream.read(1024**2), b''):
+        digest.update(block)
+
+    file.stream.seek(0)
+
+    return digest.hexdigest()
+
+
+def cache_key(upload_hash, parameters, names=None, exclude=()):
+
+    names = names if names is not None else sorted(parameters)
+    normalized = {name: parameters[name].isoformat() if isinstance(parameters[name], (datetime, pd.Timestamp))
+                  else parameters[name] for name in names if name not in exclude}
+
+    return upload_hash + ':' + json.dumps(normalized, sort_keys=True)
@@ -0,0 +1,207 @@
+import re
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+from utils.metrics import instrument
+
+date_formats = {
+    'simex': ("%d/%m/%Y %H:%M:%S", None),
+    'scada': ("%Y/%m/%d %H:%M:%S.%f", None),
+    'xls': (None, 's'),
+    'unix': (None, 's'),
+    'custom': (None, None)  # format given by the user
+}
+
+# tried when the format of a logger type does not match its file, in this order
+known_formats = ["%d/%m/%Y %H:%M:%S", "%Y/%m/%d %H:%M:%S.%f", "%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M:%S",
+                 "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%d-%m-%Y %H:%M:%S",
+                 "%d.%m.%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M:%S"]
+
+# digits of the directives a fixed width date string is made of, %f takes whatever width is left
+fixed_widths = {'%Y': 4, '%m': 2, '%d': 2, '%H': 2, '%M': 2, '%S': 2}
+
+excel_epoch = 2209161600  # seconds from the excel epoch (1899-12-30) to the unix epoch
+sample_size = 200  # values a format is checked on before the whole column is parsed with it
+unique_ratio = 0.5  # columns with fewer distinct values than this fraction are parsed per distinct value
+
+# format that last parsed a file of each logger type, tried right after the declared one for the next upload or chunk
+_detected_formats = {}
+
+
+@instrument('parse_date_format')
+def parse_date_format(date_series, format_type, custom_format=None):
+
+    if format_type not in date_formats:
+        raise ValueError('date format not in list of available formats')
+
+    # excel cells that hold a date are already converted by the reader
+    if pd.api.types.is_datetime64_any_dtype(date_series):
+        return date_series
+
+    if date_formats[format_type][1]:
+        return parse_numeric_dates(date_series, format_type)
+
+    if date_series.dtype != object:
+        date_series = date_series.astype(str)
+
+    date_format = detect_date_format(date_series, format_type, custom_format)
+
+    if date_format is not None:
+        try:
+            return parse_dates(date_series, date_format)
+        except ValueError:
+            pass
+
+    # no single format fits every row, fall back to parsing row by row
+    try:
+        return pd.to_datetime(date_series, format='mixed')
+    except Exception:
+        raise ValueError(f'{format_type.upper()} date format of file could not be parsed')
+
+
+def parse_numeric_dates(date_series, format_type):
+
+    try:
+        seconds = pd.to_numeric(date_series).to_numpy(dtype=float)
+    except (ValueError, TypeError):
+        raise ValueError(f'{format_type.upper()} date format of file could not be parsed')
+
+    if format_type == 'xls':
+        seconds = 86400 * seconds - excel_epoch
+
+    # rounded to the microsecond, the float error of a day fraction otherwise ends up as nanosecond noise
+    microseconds = np.round(seconds * 1e6)
+    valid = np.isfinite(microseconds)
+
+    if (np.abs(microseconds[valid]) > np.iinfo(np.int64).max / 1000).any():
+        raise ValueError(f'{format_type.upper()} date format of file could not be parsed')
+
+    dates = np.full(len(seconds), np.datetime64('NaT'), dtype='datetime64[ns]')
+    dates[valid] = microseconds[valid].astype(np.int64).view('datetime64[us]')
+
+    return pd.Series(dates, index=date_series.index, name=date_series.name)
+
+
+def detect_date_format(date_series, format_type, custom_format=None):
+
+    key = (format_type, custom_format)
+    declared = custom_format if format_type == 'custom' else date_formats[format_type][0]
+
+    # the first rows and rows spread over the whole column, so a format change further down is noticed as well
+    n = len(date_series)
+    positions = np.unique(np.r_[np.arange(min(n, sample_size // 2)),
+                                np.linspace(0, n - 1, sample_size // 2).astype(int)])
+    sample = date_series.iloc[positions] if n else date_series
+
+    guessed = guess_datetime_format(sample.iloc[0]) if len(sample) and isinstance(sample.iloc[0], str) else None
+
+    # the declared format always comes first, a format remembered from another file must not override it for a file
+    # that matches both (a day first date read month first)
+    for date_format in dict.fromkeys([declared, _detected_formats.get(key), *known_formats, guessed]):
+        if date_format is None:
+            continue
+
+        try:
+            pd.to_datetime(sample, format=date_format)
+        except (ValueError, TypeError):
+            continue
+
+        _detected_formats[key] = date_format
+
+        return date_format
+
+    return None
+
+
+def parse_dates(date_series, date_format):
+
+    parsed = parse_fixed_width(date_series, date_format)
+
+    if parsed is not None:
+        return parsed
+
+    # timestamps logged more often than their resolution repeat, each distinct string only needs parsing once
+    sample = date_series.iloc[:10 * sample_size]
+
+    if sample.nunique() < unique_ratio * len(sample):
+        codes, uniques = pd.factorize(date_series)
+        parsed = pd.to_datetime(uniques, format=date_format).append(pd.DatetimeIndex([pd.NaT]))  # code -1 is missing
+        return pd.Series(parsed.take(codes), index=date_series.index, name=date_series.name)
+
+    return pd.to_datetime(date_series, format=date_format)
+
+
+def parse_fixed_width(date_series, date_format):
+
+    # pandas parses anything but year first (ISO 8601 like) layouts with a per element strptime, a fixed width layout
+    # can instead be rearranged into ISO bytes for the whole column at once and parsed by numpy
+    tokens = re.findall(r'%.|[^%]', date_format)
+    directives = [token for token in tokens if token.startswith('%')]
+
+    if (len(date_series) == 0
+            or directives[:3] == ['%Y', '%m', '%d']
+            or not isinstance(date_series.iloc[0], str)
+            or len(set(directives)) != len(directives)
+            or not {'%Y', '%m', '%d'} <= set(directives)
+            or not set(directives) <= {*fixed_widths, '%f'}):
+        return None
+
+    width = len(date_series.iloc[0])
+    fraction = width - sum(fixed_widths.get(token, 1) for token in tokens if token != '%f')
+
+    if '%f' in directives and not 1 <= fraction <= 9:
+        return None
+
+    try:
+        # one extra byte per value shows strings that are longer than the first one
+        raw = date_series.to_numpy().astype(f'S{width + 1}')
+    except (UnicodeEncodeError, ValueError, TypeError):
+        return None
+
+    raw = raw.view(np.uint8).reshape(len(date_series), width + 1)
+
+    if raw[:, width].any():
+        return None
+
+    positions = {}
+    position = 0
+
+    for token in tokens:
+        size = fraction if token == '%f' else fixed_widths.get(token, 1)
+
+        if token.startswith('%'):
+            digits = raw[:, position:position + size]
+            if ((digits < ord('0')) | (digits > ord('9'))).any():
+                return None
+            positions[token] = range(position, position + size)
+        elif (raw[:, position] != ord(token)).any():
+            return None
+
+        position += size
+
+    if position != width:
+        return None
+
+    layout = [('%Y', '-'), ('%m', '-'), ('%d', 'T'), ('%H', ':'), ('%M', ':'), ('%S', '')]
+    layout += [('.', ''), ('%f', '')] if '%f' in positions else []
+    iso = []
+
+    for token, separator in layout:
+        if token in positions:
+            iso += [raw[:, column] for column in positions[token]]
+        elif token.startswith('%'):
+            iso += [np.full(len(raw), ord('0'), dtype=np.uint8)] * 2
+        else:
+            iso.append(np.full(len(raw), ord(token), dtype=np.uint8))
+
+        if separator:
+            iso.append(np.full(len(raw), ord(separator), dtype=np.uint8))
+
+    iso = np.ascontiguousarray(np.stack(iso, axis=1))
+
+    try:
+        parsed = iso.view(f'S{iso.shape[1]}').ravel().astype('datetime64[ns]')
+    except ValueError:
+        return None
+
+    return pd.Series(parsed, index=date_series.index, name=date_series.name)
@@ -0,0 +1,203 @@
+import os
+import zipfile
+import tempfile
+import threading
+import numpy as np
+from utils.metrics import instrument
+
+APP_ENV = os.getenv('APP_ENV', 'local')
+DENSITY_MODE = os.getenv('DENSITY_MODE', 'exact')
+
+if APP_ENV == 'local':
+    TABLE_DIR = 'cache'
+else:
+    TABLE_DIR = os.path.join('backend', 'cache')
+
+mixtures = {
+    'forming gas': (('nitrogen', 'hydrogen'), (0.95, 0.05))
+}
+
+gas_phase_limit = 150  # K, mixtures above this temperature are always single phase gas (N2 critical point: 126 K)
+
+table_grid = {
+    'temperature': (-20, 60, 0.5),  # °C (start, stop, step)
+    'pressure': (0.5, 40, 0.1)  # bara (start, stop, step)
+}
+table_tolerance = 1e-6  # maximum relative interpolation error, cells exceeding this are evaluated exactly
+
+_local = threading.local()
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_state(medium):
+
+    # CoolProp is imported with the first density of a process, not at startup
+    import CoolProp.CoolProp as CP
+
+    # AbstractState objects are not thread safe, so every thread builds its own state per medium
+    if not hasattr(_local, 'states'):
+        _local.states = {}
+
+    if medium not in _local.states:
+        if medium in mixtures:
+            components, fractions = mixtures[medium]
+            state = CP.AbstractState('HEOS', '&'.join(components))
+            state.set_mole_fractions(list(fractions))
+        else:
+            state = CP.AbstractState('HEOS', medium)
+
+        _local.states[medium] = state
+
+    return _local.states[medium]
+
+
+@instrument('density')
+def compute_density(temperature, pressure, medium, mode=None):
+
+    mode = mode or DENSITY_MODE
+
+    if mode == 'table':
+        return interpolate_density(temperature, pressure, medium)
+    elif mode != 'exact':
+        raise ValueError('density mode not in list of available modes')
+
+    import CoolProp.CoolProp as CP
+
+    temperature = np.atleast_1d(np.asarray(temperature, dtype=float)) + 273.15
+    pressure = np.atleast_1d(np.asarray(pressure, dtype=float)) * 1e5
+
+    state = get_state(medium)
+    density = np.full(temperature.shape, np.nan)
+
+    for i in np.flatnonzero(np.isfinite(temperature) & np.isfinite(pressure)):
+
+        # the phase stability check of a mixture flash is ~1000x slower than the density evaluation itself
+        if medium in mixtures and temperature[i] > gas_phase_limit:
+            state.specify_phase(CP.iphase_gas)
+        else:
+            state.unspecify_phase()
+
+        try:
+            state.update(CP.PT_INPUTS, pressure[i], temperature[i])
+            density[i] = state.rhomass()
+        except ValueError:
+            continue
+
+    density[~np.isfinite(density)] = np.nan
+
+    return density
+
+
+def interpolate_density(temperature, pressure, medium):
+
+    temperature = np.atleast_1d(np.asarray(temperature, dtype=float))
+    pressure = np.atleast_1d(np.asarray(pressure, dtype=float))
+
+    table = get_table(medium)
+    t_start, _, t_step = table_grid['temperature']
+    p_start, _, p_step = table_grid['pressure']
+    n_t, n_p = table['density'].shape
+
+    x = (temperature - t_start) / t_step
+    y = (pressure - p_start) / p_step
+
+    inside = (x >= 0) & (x < n_t - 1) & (y >= 0) & (y < n_p - 1)
+    i = np.where(inside, x, 0).astype(int)
+    j = np.where(inside, y, 0).astype(int)
+    inside &= table['valid'][i, j]
+
+    x -= i
+    y -= j
+    grid = table['density']
+
+    # the table holds density relative to P/T, which is nearly flat for a gas and interpolates far better
+    density = ((1 - x)*(1 - y)*grid[i, j] + x*(1 - y)*grid[i + 1, j]
+               + (1 - x)*y*grid[i, j + 1] + x*y*grid[i + 1, j + 1]) * pressure / (temperature + 273.15)
+
+    if not inside.all():
+        density[~inside] = compute_density(temperature[~inside], pressure[~inside], medium, mode='exact')
+
+    return density
+
+
+def get_table(medium):
+
+    if medium in _tables:
+        return _tables[medium]
+
+    with _tables_lock:
+        if medium not in _tables:
+            _tables[medium] = load_table(medium)
+
+    return _tables[medium]
+
+
+def load_table(medium):
+
+    import CoolProp.CoolProp as CP
+
+    temperature = np.arange(*table_grid['temperature'])
+    pressure = np.arange(*table_grid['pressure'])
+
+    file_path = os.path.join(TABLE_DIR, f"density_{medium.replace(' ', '_')}.npz")
+
+    try:
+        with np.load(file_path) as table:
+            if (table['coolprop_version'] == CP.get_global_param_string('version')
+                    and np.array_equal(table['temperature'], temperature)
+                    and np.array_equal(table['pressure'], pressure)):
+                return {'density': table['density'], 'valid': table['valid'], 'max_error': float(table['max_error'])}
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        # a missing, outdated or truncated table is built again and replaces the file
+        pass
+
+    table = build_table(medium, temperature, pressure)
+
+    # written under a temporary name and renamed once complete, so a worker reading it never sees a partly written
+    # table, and one killed while writing leaves only the temporary file behind
+    try:
+        os.makedirs(TABLE_DIR, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(delete=False, dir=TABLE_DIR, prefix='density_', suffix='.npz.part') as file:
+            try:
+                np.savez(file, temperature=temperature, pressure=pressure,
+                         coolprop_version=CP.get_global_param_string('version'), **table)
+            except Exception:
+                file.close()
+                os.remove(file.name)
+                raise
+
+        os.replace(file.name, file_path)
+    except OSError:
+        pass
+
+    return table
+
+
+@instrument('density_table')
+def build_table(medium, temperature, pressure):
+
+    grid_t, grid_p = np.meshgrid(temperature, pressure, indexing='ij')
+    density = compute_density(grid_t.ravel(), grid_p.ravel(), medium, mode='exact').reshape(grid_t.shape)
+    density *= (grid_t + 273.15) / grid_p
+
+    # the interpolation error of a cell is checked at its centre, where the bilinear error of a smooth surface peaks
+    centre_t, centre_p = np.meshgrid(temperature[:-1] + np.diff(temperature)/2,
+                                     pressure[:-1] + np.diff(pressure)/2, indexing='ij')
+    exact = compute_density(centre_t.ravel(), centre_p.ravel(), medium, mode='exact').reshape(centre_t.shape)
+    exact *= (centre_t + 273.15) / centre_p
+    interpolated = (density[:-1, :-1] + density[1:, :-1] + density[:-1, 1:] + density[1:, 1:]) / 4
+
+    with np.errstate(invalid='ignore'):
+        error = np.abs(interpolated - exact) / exact
+
+    # liquid and dense near-critical states are left to the exact evaluation, a leak test medium is a gas
+    state = get_state(medium)
+    gas = 1e5 / (density * state.gas_constant() / state.molar_mass()) > 0.5
+
+    valid = np.zeros(density.shape, dtype=bool)
+    valid[:-1, :-1] = (error <= table_tolerance) & gas[:-1, :-1] & gas[1:, :-1] & gas[:-1, 1:] & gas[1:, 1:]
+    max_error = float(error[valid[:-1, :-1]].max()) if valid.any() else np.nan
+
+    return {'density': density, 'valid': valid, 'max_error': max_error}
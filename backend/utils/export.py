@@ -1,21 +1,44 @@
-from docx import Document
 from datetime import datetime, timedelta
 import os
+import re
+import copy
+import threading
+from utils.metrics import instrument
 
 APP_ENV = os.getenv('APP_ENV', 'local')
 
+if APP_ENV == 'local':
+    template_path = 'assets/report_template.docx'
+else:
+    template_path = '/opt/app-root/src/backend/assets/report_template.docx'
 
-def export_word(parameters, results, images):
+placeholders = ['system', 'medium', 'volume', 'unit_volume', 'mass', 'unit_mass', 'leak_rate_refprop', 'leak_rate_ideal',
+                'bubble_rate', 'current_date', 'stabilization_time', 'total_test_time', 'start_time', 'end_time']
+placeholder_pattern = re.compile(r'\{(' + '|'.join(placeholders) + r')\}')
 
-    if APP_ENV == 'local':
-        template_path = 'assets/report_template.docx'
-    else:
-        template_path = '/opt/app-root/src/backend/assets/report_template.docx'
+_template = None
+_template_lock = threading.Lock()
 
-    if os.path.exists(template_path):
-        doc = Document(template_path)
-    else:
-        raise FileNotFoundError(f"Word template not found at specified path")
+
+def get_template():
+
+    global _template
+
+    # parsed once, every report edits its own deep copy
+    with _template_lock:
+        if _template is None:
+            if not os.path.exists(template_path):
+                raise FileNotFoundError(f"Word template not found at specified path")
+            from docx import Document
+            _template = Document(template_path)
+
+        return copy.deepcopy(_template)
+
+
+@instrument('export_word')
+def export_word(parameters, results, images):
+
+    doc = get_template()
 
     if results['measured_volume']:
         volume = results['measured_volume']
@@ -37,58 +60,145 @@ def export_word(parameters, results, images):
                     + timedelta(hours=periodic_limit)*int(results['periods'])).strftime('%d-%m-%Y %H:%M:%S')
 
     placers = {
-        '{system}': parameters['system_name'],
-        '{medium}': parameters['medium'],
-        '{volume}': str(volume),
-        '{unit_volume}': unit_volume,
-        '{mass}': str(mass),
-        '{unit_mass}': unit_mass,
-        '{leak_rate_refprop}': str(results['mass_rate']),
-        '{leak_rate_ideal}': str(results['ideal_gas_rate']),
-        '{bubble_rate}': str(results['bubble_rate']),
-        '{current_date}': datetime.now().strftime('%d-%m-%Y'),
-        '{stabilization_time}': str(results['stabilization_time']),
-        '{total_test_time}': str(results['total_test_time']),
-        '{start_time}': datetime.strptime(parameters['start_time'], '%Y-%m-%dT%H:%M:%S').strftime('%d-%m-%Y %H:%M:%S'),
-        '{end_time}': end_time
+        'system': parameters['system_name'],
+        'medium': parameters['medium'],
+        'volume': str(volume),
+        'unit_volume': unit_volume,
+        'mass': str(mass),
+        'unit_mass': unit_mass,
+        'leak_rate_refprop': str(results['mass_rate']),
+        'leak_rate_ideal': str(results['ideal_gas_rate']),
+        'bubble_rate': str(results['bubble_rate']),
+        'current_date': datetime.now().strftime('%d-%m-%Y'),
+        'stabilization_time': str(results['stabilization_time']),
+        'total_test_time': str(results['total_test_time']),
+        'start_time': datetime.strptime(parameters['start_time'], '%Y-%m-%dT%H:%M:%S').strftime('%d-%m-%Y %H:%M:%S'),
+        'end_time': end_time
     }
 
-    target_starts = ['Leak rate (mass-density)', 'Leak rate (ideal gas law)', 'Bubble diameter rate']
+    target_starts = ('Leak rate (mass-density)', 'Leak rate (ideal gas law)', 'Bubble diameter rate')
 
-    def replace_text(paragraphs):
-        for paragraph in paragraphs:
-            for placeholder, value in placers.items():
-                if placeholder in paragraph.text:
-                    paragraph.text = paragraph.text.replace(placeholder, value)
+    page_width = None
+    for section in doc.sections:
+        page_width = section.page_width - section.left_margin - section.right_margin
+
+    # every paragraph is visited once and all of its placeholders are replaced by one regex pass,
+    # a placeholder split over several runs is matched on the paragraph text
+    for paragraph in document_paragraphs(doc):
+        text = paragraph.text
 
-    replace_text(doc.paragraphs)
+        if '{' in text:
+            replaced = placeholder_pattern.sub(lambda match: placers[match.group(1)], text)
+            if replaced != text:
+                paragraph.text = replaced
 
     for paragraph in doc.paragraphs:
-        for start in target_starts:
-            if paragraph.text.startswith(start):
-                prefix, suffix = paragraph.text.split(':')
-                paragraph.clear()
-                paragraph.add_run(prefix + ':')
-                paragraph.add_run(suffix).bold = True
+        if paragraph.text.startswith(target_starts):
+            prefix, suffix = paragraph.text.split(':')
+            paragraph.clear()
+            paragraph.add_run(prefix + ':')
+            paragraph.add_run(suffix).bold = True
+
+        if paragraph.text.startswith(target_starts[-1]) and results.get('period_results'):
+            add_period_table(doc, paragraph, results['period_results'])
+
+        if paragraph.text.startswith(target_starts[-1]) and 'uncertainty' in results:
+            add_uncertainty(doc, paragraph, results['uncertainty'])
+
+    for image in images:
+        doc.add_picture(image, width=page_width)
+
+    return doc
+
+
+def add_period_table(doc, paragraph, period_results):
+
+    columns = ['Period', 'Time [hours]', 'Leak rate (mass-density) [grams/year]', 'Leak rate (ideal gas law) [grams/year]']
+    table = doc.add_table(rows=1, cols=len(columns))
+    table.style = 'Table Grid'
 
+    for cell, column in zip(table.rows[0].cells, columns):
+        cell.text = column
+        cell.paragraphs[0].runs[0].bold = True
+
+    for period in period_results:
+        values = [period['period'], f"{period['start_time']} - {period['end_time']}",
+                  f"{period['mass_rate']} ± {period['mass_rate_ci']}",
+                  f"{period['ideal_gas_rate']} ± {period['ideal_gas_rate_ci']}"]
+
+        for cell, value in zip(table.add_row().cells, values):
+            cell.text = str(value)
+
+    # the table is added at the end of the document and moved below the leak rates, with the 95 % intervals explained
+    note = doc.add_paragraph('Leak rate per 24-hour period, ± the 95% confidence interval of the trendline slope.')
+    paragraph._p.addnext(note._p)
+    note._p.addnext(table._tbl)
+
+
+def add_uncertainty(doc, paragraph, uncertainty):
+
+    if uncertainty is None:
+        note = doc.add_paragraph('The uncertainty from the stated sensor and volume accuracy is unavailable: the density '
+                                 'cannot be evaluated around some of the readings.')
+        paragraph._p.addnext(note._p)
+        return
+
+    low, _, high = range(3)
+    note = doc.add_paragraph(
+        f"95% interval from the stated sensor and volume accuracy ({uncertainty['draws']} Monte Carlo draws): "
+        f"leak rate (mass-density) {uncertainty['mass_rate'][low]} to {uncertainty['mass_rate'][high]} grams/year, "
+        f"leak rate (ideal gas law) {uncertainty['ideal_gas_rate'][low]} to {uncertainty['ideal_gas_rate'][high]} "
+        f"grams/year, bubble diameter rate {uncertainty['bubble_rate'][low]} to {uncertainty['bubble_rate'][high]} mm/s.")
+    paragraph._p.addnext(note._p)
+
+
+def document_paragraphs(doc):
+
+    yield from doc.paragraphs
+
+    tables = list(doc.tables)
     for section in doc.sections:
-        page_width = section.page_width - section.left_margin - section.right_margin
-        for table in section.first_page_header.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    replace_text(cell.paragraphs)
+        tables += section.first_page_header.tables
+
+    # merged cells show up once per grid column they span, their paragraphs are only visited once
+    seen = set()
 
-    for table in doc.tables:
+    for table in tables:
         for row in table.rows:
             for cell in row.cells:
-                for placeholder, value in placers.items():
-                    if placeholder in cell.text:
-                        for paragraph in cell.paragraphs:
-                            for run in paragraph.runs:
-                                run.text = run.text.replace(placeholder, value)
-                            paragraph.text = paragraph.text.replace(placeholder, value)
+                if cell._tc in seen:
+                    continue
+                seen.add(cell._tc)
+                yield from cell.paragraphs
 
-    for image in images:
-        doc.add_picture(image, width=page_width )
+
+@instrument('export_summary')
+def export_summary(reports):
+
+    from docx import Document
+    doc = Document()
+    doc.add_heading('Pressure decay test results', level=1)
+    doc.add_paragraph(f"Summary of {len(reports)} systems, generated on {datetime.now().strftime('%d-%m-%Y')}")
+
+    columns = ['System', 'Medium', 'Leak rate (mass-density) [g/year]', 'Leak rate (ideal gas law) [g/year]',
+               'Bubble diameter rate [mm/s]', 'Volume [liter]', 'Test time [hours]']
+    table = doc.add_table(rows=1, cols=len(columns))
+    table.style = 'Table Grid'
+
+    for cell, column in zip(table.rows[0].cells, columns):
+        cell.text = column
+        cell.paragraphs[0].runs[0].bold = True
+
+    for parameters, results in reports:
+        volume = results['measured_volume'] if results['measured_volume'] else parameters['volume']
+
+        if not results['measured_volume'] and parameters['unit_volume'] == 'm3':
+            volume = volume * 1000
+
+        values = [parameters['system_name'], parameters['medium'], results['mass_rate'], results['ideal_gas_rate'],
+                  results['bubble_rate'], volume, results['total_test_time']]
+
+        for cell, value in zip(table.add_row().cells, values):
+            cell.text = str(value)
 
     return doc
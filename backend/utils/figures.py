@@ -0,0 +1,130 @@
+import os
+import threading
+from contextlib import contextmanager
+from utils.cache import LRUCache
+
+
+class FigureCache:
+
+    def __init__(self, directory, max_bytes, max_disk_bytes, temp_store=None):
+
+        self.directory = directory
+        self.memory = LRUCache(max_bytes=max_bytes)
+        self.disk = LRUCache(max_bytes=max_disk_bytes, on_evict=lambda key, path: self.remove_file(path))
+
+        # the temp storage manager of the directory, if any, counts the files against its quota
+        self.temp_store = temp_store
+
+        # one render at a time per analysis, so a request waits for the background render instead of repeating it
+        # (utils/plot still renders one figure at a time per process).
+        # analysis id: [lock, threads holding or waiting for it], dropped with the last of them
+        self.render_locks = {}
+        self.locks_lock = threading.Lock()
+
+    def get(self, analysis_id, name, render):
+        return self.get_many(analysis_id, [name], lambda names: [render()])[0]
+
+    def get_many(self, analysis_id, names, render):
+
+        keys = [f'{analysis_id}_{name}' for name in names]
+        images = [self.lookup(key) for key in keys]
+
+        if any(image is None for image in images):
+            with self.render_lock(analysis_id):
+                images = [self.lookup(key) for key in keys]
+                missing = [i for i, image in enumerate(images) if image is None]
+
+                if missing:
+                    for i, image in zip(missing, render([names[i] for i in missing])):
+                        images[i] = image.getvalue()
+                        self.store(keys[i], images[i])
+
+        return images
+
+    @contextmanager
+    def render_lock(self, analysis_id):
+
+        with self.locks_lock:
+            entry = self.render_locks.setdefault(analysis_id, [threading.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.locks_lock:
+                entry[1] -= 1
+
+                if entry[1] == 0 and self.render_locks.get(analysis_id) is entry:
+                    del self.render_locks[analysis_id]
+
+    def lookup(self, key):
+
+        image = self.memory.get(key)
+
+        if image is None:
+            path = self.disk.get(key)
+
+            if path is not None:
+                try:
+                    with open(path, 'rb') as file:
+                        image = file.read()
+                except FileNotFoundError:
+                    self.disk.pop(key)
+                    return None
+
+                self.memory.put(key, image)
+
+        return image
+
+    def store(self, key, image):
+
+        self.memory.put(key, image)
+
+        if len(image) > self.disk.max_bytes:
+            return
+
+        path = os.path.join(self.directory, f'figure_{key}.png')
+        temp_path = path + '.tmp'
+
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(image)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+
+        if self.temp_store:
+            self.temp_store.add(path, 'figure', owner=key.split('_')[0])
+
+        self.disk.put(key, path, size=len(image))
+
+    def invalidate(self, analysis_id):
+
+        with self.locks_lock:
+            self.render_locks.pop(analysis_id, None)
+
+        for key in self.memory.keys():
+            if key.startswith(f'{analysis_id}_'):
+                self.memory.pop(key)
+
+        for key in self.disk.keys():
+            path = self.disk.pop(key) if key.startswith(f'{analysis_id}_') else None
+
+            if path:
+                self.remove_file(path)
+
+    def remove_file(self, path):
+
+        if self.temp_store:
+            self.temp_store.remove(path)
+        else:
+            remove_file(path)
+
+
+def remove_file(path):
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,63 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueue:
+
+    def __init__(self, workers, max_jobs, ttl):
+
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_jobs = max_jobs  # queued and running jobs, further submissions are rejected
+        self.ttl = ttl  # seconds a finished job is kept for its result to be collected
+        self.jobs = {}
+        self.active = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args):
+
+        with self.lock:
+            if self.active >= self.max_jobs:
+                self.rejected += 1
+                return None
+
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {'status': 'queued', 'submitted': time.time(), 'started': None, 'finished': None,
+                                 'result': None, 'error': None}
+            self.active += 1
+
+        self.executor.submit(self.run, job_id, func, *args)
+
+        return job_id
+
+    def run(self, job_id, func, *args):
+
+        job = self.jobs[job_id]
+        job['status'] = 'running'
+        job['started'] = time.time()
+
+        try:
+            job['result'] = func(*args)
+            job['status'] = 'finished'
+        except Exception as e:
+            job['error'] = e
+            job['status'] = 'failed'
+        finally:
+            job['finished'] = time.time()
+
+            with self.lock:
+                self.active -= 1
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cleanup(self):
+
+        now = time.time()
+
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items()
+                           if job['finished'] and now - job['finished'] > self.ttl]:
+                del self.jobs[job_id]
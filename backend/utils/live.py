@@ -0,0 +1,275 @@
+import copy
+import math
+import time
+import uuid
+import threading
+import numpy as np
+import pandas as pd
+from utils.density import compute_density
+from utils.analysis import (pressure_conversion, temperature_conversion, mass_volume_conversion,
+                            calculate_ideal_gas_rate, calculate_mass_rate, calculate_bubble_rate)
+
+periodic_limit = 24  # hours, as in analysis.data_processing
+
+
+class RunningFit:
+
+    # least squares line through (x, y), updated in constant time per point (Welford co-moments)
+    __slots__ = ['n', 'mean_x', 'mean_y', 'm2_x', 'c_xy', 'last_x']
+
+    def __init__(self):
+
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.c_xy = 0.0
+        self.last_x = None
+
+    def add(self, x, y):
+
+        self.n += 1
+        dx = x - self.mean_x
+        self.mean_x += dx / self.n
+        self.mean_y += (y - self.mean_y) / self.n
+        self.m2_x += dx * (x - self.mean_x)
+        self.c_xy += dx * (y - self.mean_y)
+        self.last_x = x
+
+    def merge(self, other):
+
+        if other.n == 0:
+            return copy.copy(self)
+        if self.n == 0:
+            return copy.copy(other)
+
+        merged = RunningFit()
+        merged.n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        merged.mean_x = self.mean_x + dx * other.n / merged.n
+        merged.mean_y = self.mean_y + dy * other.n / merged.n
+        merged.m2_x = self.m2_x + other.m2_x + dx * dx * self.n * other.n / merged.n
+        merged.c_xy = self.c_xy + other.c_xy + dx * dy * self.n * other.n / merged.n
+        merged.last_x = other.last_x
+
+        return merged
+
+    def parameters(self):
+
+        if self.n < 2 or self.m2_x <= 0:
+            return None
+
+        slope = self.c_xy / self.m2_x
+
+        return slope, self.mean_y - slope * self.mean_x
+
+
+class LiveTest:
+
+    def __init__(self, parameters):
+
+        self.parameters = parameters
+        self.created = time.time()
+        self.updated = self.created
+        self.n_readings = 0
+        self.lock = threading.Lock()
+
+        self.convert_pressure = pressure_conversion(parameters['unit_pressure'])
+        self.convert_temperature = temperature_conversion(parameters['unit_temperature'])
+        self.volume = None if parameters['mass'] else mass_volume_conversion(parameters['unit_volume'])(parameters['volume'])
+
+        # the minute bin that is still being filled: [minute, pressure sum, pressure count, temperature sum,
+        # temperature count], a missing reading only counts against its own column as in analysis.bucket_rows
+        self.open_bin = None
+        self.state = {
+            'closed_pt': RunningFit(), 'closed_density': RunningFit(),  # completed 24-hour periods
+            'current_pt': RunningFit(), 'current_density': RunningFit(),  # the running period
+            'period': 1,
+            'last_time': None,
+            'first_valid_time': None,
+            'max_pt': None  # (P/T, time, temperature) of the first maximum, for the volume of a mass input
+        }
+
+    def add_readings(self, dates, pressures, temperatures):
+
+        dates = pd.DatetimeIndex(dates)
+        pressures = self.convert_pressure(np.asarray(pressures, dtype=float))
+        temperatures = self.convert_temperature(np.asarray(temperatures, dtype=float))
+
+        if len(dates) == 0:
+            return
+
+        if not dates.is_monotonic_increasing:
+            raise ValueError('readings must be in chronological order')
+
+        minutes = dates.floor(self.parameters['resample_period'])
+
+        with self.lock:
+            if self.open_bin and minutes[0] < self.open_bin[0]:
+                raise ValueError('readings must be later than the readings pushed before')
+
+            if not self.parameters['start_time'] or (self.n_readings == 0 and self.parameters['start_time'] < dates[0]):
+                self.parameters['start_time'] = dates[0].round('min')
+
+            starts = np.flatnonzero(np.r_[True, minutes[1:] != minutes[:-1]])
+            bins = [minutes[starts]]
+
+            for values in [pressures, temperatures]:
+                missing = np.isnan(values)
+                bins += [np.add.reduceat(np.where(missing, 0, values), starts), np.add.reduceat(~missing, starts)]
+
+            bins = [list(values) for values in bins]
+
+            if self.open_bin and self.open_bin[0] == bins[0][0]:
+                for values, value in zip(bins[1:], self.open_bin[1:]):
+                    values[0] += value
+            elif self.open_bin:
+                for values, value in zip(bins, self.open_bin):
+                    values.insert(0, value)
+
+            # only the finished bins get their density computed and folded into the fits, the last bin stays open
+            self.open_bin = [values[-1] for values in bins]
+            self.add_bins(self.state, *[values[:-1] for values in bins])
+
+            self.n_readings += len(dates)
+            self.updated = time.time()
+
+    def add_bins(self, state, minutes, pressure_sums, pressure_counts, temperature_sums, temperature_counts):
+
+        if len(minutes) == 0:
+            return
+
+        # a bin without a pressure or a temperature reading has no P/T and no density, and stays out of the fits
+        with np.errstate(invalid='ignore'):
+            pressure = np.array(pressure_sums, dtype=float) / np.array(pressure_counts)
+            temperature = np.array(temperature_sums, dtype=float) / np.array(temperature_counts)
+
+        pressure_over_temperature = pressure / (temperature + 273.15)
+        density = compute_density(temperature, pressure, self.parameters['medium'])
+        start_time = pd.Timestamp(self.parameters['start_time'])
+        end_time = self.parameters['end_time'] and pd.Timestamp(self.parameters['end_time'])
+
+        for minute, t, pt, rho in zip(minutes, temperature, pressure_over_temperature, density):
+
+            hours = (minute - start_time).total_seconds() / 3600
+            state['last_time'] = hours
+
+            if not np.isnan(pt) and (state['max_pt'] is None or pt > state['max_pt'][0]):
+                state['max_pt'] = (pt, hours, t)
+
+            if state['first_valid_time'] is None and not np.isnan(rho):
+                state['first_valid_time'] = hours
+
+            if hours < 0 or (self.parameters['periodic_limit_off'] and end_time and minute > end_time):
+                continue
+
+            # a period covers (24(k-1), 24k] hours, once a later bin arrives it is folded into the completed ones
+            period = max(1, math.ceil(hours / periodic_limit))
+
+            if period > state['period']:
+                for name in ['pt', 'density']:
+                    state[f'closed_{name}'] = state[f'closed_{name}'].merge(state[f'current_{name}'])
+                    state[f'current_{name}'] = RunningFit()
+                state['period'] = period
+
+            if not np.isnan(pt):
+                state['current_pt'].add(hours, pt)
+
+            if not np.isnan(rho):
+                state['current_density'].add(hours, rho)
+
+    def status(self):
+
+        with self.lock:
+            state = copy.deepcopy(self.state)
+            open_bin = self.open_bin and [[value] for value in self.open_bin]
+            status = {'readings': self.n_readings, 'created': self.created, 'updated': self.updated,
+                      'start_time': self.parameters['start_time'] and pd.Timestamp(self.parameters['start_time']).isoformat()}
+
+        # the open bin counts as it would in an upload of the readings so far, without closing it
+        if open_bin:
+            self.add_bins(state, *open_bin)
+
+        running = [state['closed_pt'].merge(state['current_pt']), state['closed_density'].merge(state['current_density'])]
+
+        if self.parameters['periodic_limit_off']:
+            complete = running
+        elif state['last_time'] is not None and state['last_time'] >= state['period'] * periodic_limit:
+            complete = running
+        else:
+            complete = [state['closed_pt'], state['closed_density']]
+
+        status['results'] = self.results(state, *complete)
+        status['running_results'] = self.results(state, *running)
+
+        return status
+
+    def results(self, state, pt_fit, density_fit):
+
+        trendline_pt = pt_fit.parameters()
+        trendline_density = density_fit.parameters()
+
+        if trendline_pt is None or trendline_density is None:
+            return None
+
+        volume = self.volume
+
+        if volume is None:
+            _, hours, t = state['max_pt']
+            mass = mass_volume_conversion(self.parameters['unit_volume'])(self.parameters['mass'])
+            density = compute_density(t, (trendline_pt[0] * hours + trendline_pt[1]) * (t + 273.15),
+                                      self.parameters['medium'])[0]
+
+            if np.isnan(density):
+                return None
+
+            volume = mass / density
+
+        trendline_mass = (trendline_density[0] * volume, trendline_density[1] * volume)
+
+        return {
+            'trendline_parameters_P/T': [float(value) for value in trendline_pt],
+            'trendline_parameters_mass': [float(value) for value in trendline_mass],
+            'measured_volume': round(volume*1000, 1) if self.volume is None else None,
+            'ideal_gas_rate': calculate_ideal_gas_rate(trendline_pt[0], volume),
+            'mass_rate': calculate_mass_rate(trendline_mass[0]),
+            'bubble_rate': float(calculate_bubble_rate(trendline_mass[0], density_fit.mean_y)),
+            'stabilization_time': round(-state['first_valid_time'], 1),
+            'total_test_time': round(density_fit.last_x, 1),
+            'periods': int(density_fit.last_x // periodic_limit + 1)
+        }
+
+
+class LiveTests:
+
+    def __init__(self, ttl):
+
+        self.ttl = ttl  # seconds without readings after which a test is dropped
+        self.tests = {}
+        self.lock = threading.Lock()
+
+    def create(self, parameters):
+
+        test_id = uuid.uuid4().hex
+
+        with self.lock:
+            self.tests[test_id] = LiveTest(parameters)
+
+        return test_id
+
+    def get(self, test_id):
+        return self.tests.get(test_id)
+
+    def pop(self, test_id):
+
+        with self.lock:
+            return self.tests.pop(test_id, None)
+
+    def cleanup(self):
+
+        now = time.time()
+
+        with self.lock:
+            for test_id in [test_id for test_id, test in self.tests.items() if now - test.updated > self.ttl]:
+                del self.tests[test_id]
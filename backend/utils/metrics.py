@@ -0,0 +1,270 @@
+import os
+import time
+import bisect
+import numbers
+import cProfile
+import functools
+import threading
+import tracemalloc
+
+# Windows has no resource module, the peak memory of the process is then left out of /metrics
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# peak memory per stage needs tracemalloc, which slows allocations down, so it is off unless asked for
+METRICS_MEMORY = os.getenv('METRICS_MEMORY', '0') == '1'
+# lets a request ask for a profile dump with ?profile=cprofile or ?profile=tracemalloc
+METRICS_PROFILING = os.getenv('METRICS_PROFILING', '0') == '1'
+
+profile_kinds = {'cprofile': 'prof', 'tracemalloc': 'tracemalloc'}  # kind: file extension
+
+duration_buckets = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]  # seconds
+row_buckets = [10**exponent for exponent in range(1, 9)]
+byte_buckets = [10**exponent for exponent in range(3, 11)]
+
+_local = threading.local()
+_lock = threading.Lock()
+_histograms = {}
+_collectors = []
+
+if METRICS_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class Histogram:
+
+    def __init__(self, name, description, buckets, label_name):
+
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label_name = label_name
+        self.series = {}  # label value: [bucket counts, sum, count]
+
+    def observe(self, label, value):
+
+        series = self.series.setdefault(label, [[0]*len(self.buckets), 0, 0])
+        index = bisect.bisect_left(self.buckets, value)
+
+        if index < len(self.buckets):
+            series[0][index] += 1
+
+        series[1] += value
+        series[2] += 1
+
+    def exposition(self):
+
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+
+        for label, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{self.label_name}="{label}",le="{bound:g}"}} {cumulative}')
+
+            lines.append(f'{self.name}_bucket{{{self.label_name}="{label}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{self.label_name}="{label}"}} {sample_value(total)}')
+            lines.append(f'{self.name}_count{{{self.label_name}="{label}"}} {count}')
+
+        return lines
+
+
+def histogram(name, description, buckets, label_name='stage'):
+
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, description, buckets, label_name)
+
+    return _histograms[name]
+
+
+def observe(name, label, value):
+
+    metric = _histograms[name]
+
+    with _lock:
+        metric.observe(label, value)
+
+
+def instrument(stage):
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+
+            stack = _local.__dict__.setdefault('stages', [])
+
+            # recursive calls (density of the cells outside a table) are part of the outer call
+            if stage in stack:
+                return func(*args, **kwargs)
+
+            stack.append(stage)
+            memory = start_memory()
+            start = time.perf_counter()
+
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                peak = stop_memory(memory)
+                stack.pop()
+
+            input_rows = rows(args[0]) if args else None
+            output_rows = rows(result)
+
+            observe('pressure_decay_stage_duration_seconds', stage, seconds)
+
+            if input_rows is not None:
+                observe('pressure_decay_stage_input_rows', stage, input_rows)
+            if output_rows is not None:
+                observe('pressure_decay_stage_output_rows', stage, output_rows)
+            if args and hasattr(args[0], 'stream'):
+                observe('pressure_decay_stage_bytes_read', stage, stream_size(args[0].stream))
+            if peak is not None:
+                observe('pressure_decay_stage_peak_memory_bytes', stage, peak)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def start_memory():
+
+    if not tracemalloc.is_tracing():
+        return None
+
+    # the peak of an enclosing stage so far is carried over, as the reset below would lose it
+    current, peak = tracemalloc.get_traced_memory()
+    outer = _local.__dict__.setdefault('peaks', [])
+
+    if outer:
+        outer[-1] = max(outer[-1], peak)
+
+    outer.append(current)
+    tracemalloc.reset_peak()
+
+    return current
+
+
+def stop_memory(start):
+
+    if start is None:
+        return None
+
+    outer_peak = _local.peaks.pop()
+
+    # tracing can be switched off meanwhile by the end of a profiled request in another thread
+    if not tracemalloc.is_tracing():
+        return None
+
+    peak = max(tracemalloc.get_traced_memory()[1], outer_peak)
+
+    if _local.peaks:
+        _local.peaks[-1] = max(_local.peaks[-1], peak)
+
+    return peak - start
+
+
+def rows(value):
+
+    if isinstance(value, tuple) and value:
+        value = value[0]
+
+    shape = getattr(value, 'shape', None)
+
+    return shape[0] if shape else None
+
+
+def stream_size(stream):
+
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(position)
+    except (AttributeError, OSError):
+        return 0
+
+    return size
+
+
+def start_profile(kind):
+
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return kind, profiler
+    elif kind == 'tracemalloc':
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(25)
+        return kind, started
+    else:
+        raise ValueError(f'profile kind not in list of available kinds: {list(profile_kinds)}')
+
+
+def stop_profile(profile, directory, name):
+
+    kind, handle = profile
+    path = os.path.join(directory, f"profile_{name}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_"
+                                    f"{threading.get_ident()}.{profile_kinds[kind]}")
+
+    if kind == 'cprofile':
+        handle.disable()
+        handle.dump_stats(path)
+    else:
+        snapshot = tracemalloc.take_snapshot()
+        if handle and not METRICS_MEMORY:
+            tracemalloc.stop()
+        snapshot.dump(path)
+
+    return path
+
+
+def register_collector(collector):
+
+    # collectors return (name, type, description, {label: value}) tuples of values kept elsewhere, e.g. cache counters
+    _collectors.append(collector)
+
+
+def exposition():
+
+    with _lock:
+        lines = [line for metric in _histograms.values() for line in metric.exposition()]
+
+    if resource is not None:
+        lines += ['# HELP pressure_decay_process_max_rss_bytes peak resident memory of the process',
+                  '# TYPE pressure_decay_process_max_rss_bytes gauge',
+                  f'pressure_decay_process_max_rss_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}']
+
+    for collector in _collectors:
+        for name, metric_type, description, values in collector():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+            lines += [f'{name}{{{label}}} {sample_value(value)}' if label else f'{name} {sample_value(value)}'
+                      for label, value in values.items()]
+
+    return '\n'.join(lines) + '\n'
+
+
+def sample_value(value):
+
+    # every digit of a counter, :g keeps six and a counter past a million stops showing its increments
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+
+    return repr(float(value))
+
+
+histogram('pressure_decay_stage_duration_seconds', 'wall time of a pipeline stage', duration_buckets)
+histogram('pressure_decay_stage_input_rows', 'rows going into a pipeline stage', row_buckets)
+histogram('pressure_decay_stage_output_rows', 'rows coming out of a pipeline stage', row_buckets)
+histogram('pressure_decay_stage_bytes_read', 'bytes of the uploaded file read by a stage', byte_buckets)
+histogram('pressure_decay_stage_peak_memory_bytes', 'peak traced memory above the start of a stage (METRICS_MEMORY=1)',
+          byte_buckets)
+histogram('pressure_decay_http_request_duration_seconds', 'wall time of a request', duration_buckets, 'endpoint')
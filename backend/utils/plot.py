@@ -1,65 +1,150 @@
 import io
-import matplotlib
-import matplotlib.pyplot as plt
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from utils.analysis import include_index
+from utils.metrics import instrument
 
-matplotlib.use('Agg')
-plt.style.use('seaborn-v0_8-white')
+PLOT_WORKERS = int(os.getenv('PLOT_WORKERS', min(4, os.cpu_count() or 1)))
 
+export_dpi = 300
+preview_dpi = 100  # web page only, the report keeps the full resolution
+plot_columns = ['time', 'include', 'count_period', 'pressure', 'temperature', 'P/T', 'trendline_P/T', 'mass',
+                'trendline_mass']
 
-def plot_all(data, results):
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+_figure = None
+_figure_lock = threading.Lock()
 
-    fig, axes = plt.subplots(2, 2, figsize=(16, 8))
+# the Figure API keeps no pyplot state, but the mathtext parser of the trendline labels is shared by the whole process
+# and fails when two threads use it at once, so one render at a time runs in a process
+_render_lock = threading.Lock()
 
-    plot_pressure_over_temperature_full(axes[0, 0], data, results)
-    plot_pressure_over_temperature(axes[0, 1], data, results)
-    plot_pressure_and_temperature(axes[1, 0], data, results)
-    plot_mass(axes[1, 1], data, results)
 
-    plt.tight_layout()
+@instrument('plot_all')
+def plot_all(data, results, dpi=export_dpi):
 
-    img = io.BytesIO()
-    plt.savefig(img, format='png', dpi=300)
-    img.seek(0)
-    plt.close()
+    figure = figure_class()
+
+    with _render_lock:
+        fig = figure(figsize=(16, 8), dpi=dpi)
+        axes = fig.subplots(2, 2)
+
+        plot_pressure_over_temperature_full(axes[0, 0], data, results)
+        plot_pressure_over_temperature(axes[0, 1], data, results)
+        plot_pressure_and_temperature(axes[1, 0], data, results)
+        plot_mass(axes[1, 1], data, results)
+
+        fig.tight_layout()
+
+        img = io.BytesIO()
+        fig.savefig(img, format='png', dpi=dpi)
+        img.seek(0)
 
     return img
 
 
-def plot_individual(data, results):
+def plot_individual(data, results, workers=None):
+    return plot_panels(individual_plots(), data, results, workers=workers)
+
+
+@instrument('plot_panels')
+def plot_panels(plot_funcs, data, results, dpi=export_dpi, workers=None):
+
+    workers = PLOT_WORKERS if workers is None else workers
+
+    if workers <= 1 or len(plot_funcs) <= 1:
+        return [plot_single(plot_func, data, results, dpi) for plot_func in plot_funcs]
+
+    data = data[plot_columns]
+
+    def render(executor):
+        futures = [executor.submit(plot_single, plot_func, data, results, dpi) for plot_func in plot_funcs]
+        return [future.result() for future in futures]
+
+    executor = get_executor(workers)
+
+    # a worker killed while rendering (out of memory) breaks the whole pool for good, it is replaced and the panels
+    # rendered once more
+    try:
+        return render(executor)
+    except BrokenProcessPool:
+        return render(get_executor(workers, broken=executor))
+
+
+def get_executor(workers, broken=None):
+
+    global _executor, _executor_workers
+
+    # spawned workers do not inherit the locks and threads of the web server, the lock keeps concurrent bulk export
+    # reports from starting a pool each. A broken pool is only replaced once, by the first thread that finds it
+    with _executor_lock:
+        if _executor is None or _executor is broken or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+
+        return _executor
+
+
+def figure_class():
+
+    global _figure
+
+    # matplotlib takes longer to import than the rest of the app, so it is loaded with the first plot of a process
+    with _figure_lock:
+        if _figure is None:
+            import matplotlib.style
+            from matplotlib.figure import Figure
+
+            matplotlib.style.use('seaborn-v0_8-white')
+            _figure = Figure
 
-    plot_functions = [plot_pressure_over_temperature_full,
-                      plot_pressure_over_temperature,
-                      plot_mass,
-                      plot_pressure_and_temperature]
-    plot_images = []
+        return _figure
 
-    for plot_func in plot_functions:
 
-        plt.figure(figsize=(10, 4.5))
-        axis = plt.gca()
+def individual_plots():
+    return [plot_pressure_over_temperature_full,
+            plot_pressure_over_temperature,
+            plot_mass,
+            plot_pressure_and_temperature,
+            plot_period_rates]
+
+
+def plot_single(plot_func, data, results, dpi=export_dpi):
+
+    figure = figure_class()
+
+    with _render_lock:
+        fig = figure(figsize=(10, 4.5), dpi=dpi)
+        axis = fig.add_subplot()
         plot_func(axis, data, results)
 
         img = io.BytesIO()
-        plt.savefig(img, format='png', dpi=300)
+        fig.savefig(img, format='png', dpi=dpi)
         img.seek(0)
-        plt.close()
-
-        plot_images.append(img)
 
-    return plot_images
+    return img
 
 
 def plot_pressure_over_temperature_full(axis, data, results):
 
-    axis.plot(data.time - data.time.iloc[0], data['P/T'], label='pressure / temperature', lw=2)
+    time, include = data.time.to_numpy(), include_index(data)
+    plot_line(axis, time - time[0], data['P/T'], label='pressure / temperature', lw=2)
     axis.plot([], [], label='system temperature', lw=1, c='C3')
-    axis.plot(data.time[data.include] - data.time.iloc[0], data['trendline_P/T'][data.include], label='P/T trendline', ls='--', lw=1.5)
+    plot_line(axis, time[include] - time[0], data['trendline_P/T'].to_numpy()[include], label='P/T trendline', ls='--', lw=1.5)
 
-    axis.axvline(data.time[data.include].iloc[0] - data.time.iloc[0], ls='--', lw=1, c='k', label='analysis start & end point')
-    axis.axvline(data.time[data.include].iloc[-1] - data.time.iloc[0], ls='--', lw=1, c='k')
+    axis.axvline(time[include][0] - time[0], ls='--', lw=1, c='k', label='analysis start & end point')
+    axis.axvline(time[include][-1] - time[0], ls='--', lw=1, c='k')
     axis.plot([], [], label='24-hour period', ls='--', lw=0.5, c='k')
 
-    axis.plot(data.time[data.include].iloc[0] - data.time.iloc[0], data['P/T'][data.include].iloc[0], markersize=10, marker='x', c='k')
+    axis.plot(time[include][0] - time[0], data['P/T'].to_numpy()[include][0], markersize=10, marker='x', c='k')
 
     plot_period_lines(axis, data, full_range=True)
 
@@ -68,7 +153,7 @@ def plot_pressure_over_temperature_full(axis, data, results):
     axis.set_xlabel('Time [hours]')
 
     twin_axis = axis.twinx()
-    twin_axis.plot(data.time - data.time.iloc[0], data.temperature, lw=1, c='C3')
+    plot_line(twin_axis, time - time[0], data.temperature, lw=1, c='C3')
     twin_axis.set_ylabel('Temperature [°C]')
 
     handles, labels = axis.get_legend_handles_labels()
@@ -79,15 +164,16 @@ def plot_pressure_over_temperature_full(axis, data, results):
 
 def plot_pressure_over_temperature(axis, data, results):
 
+    time, include = data.time.to_numpy(), include_index(data)
     trendline_label = f"P/T trendline: {trendline_formula(results['trendline_parameters_P/T'])}"
 
-    axis.plot(data.time[data.include], data['P/T'][data.include], label='pressure / temperature', lw=1)
-    axis.plot(data.time[data.include], data['trendline_P/T'][data.include], label=trendline_label, ls='--', lw=3)
+    plot_line(axis, time[include], data['P/T'].to_numpy()[include], label='pressure / temperature', lw=1)
+    plot_line(axis, time[include], data['trendline_P/T'].to_numpy()[include], label=trendline_label, ls='--', lw=3)
 
     plot_period_lines(axis, data)
 
-    axis.axvline(data.time[data.include].iloc[0], ls='--', lw=1, c='k')
-    axis.axvline(data.time[data.include].iloc[-1], ls='--', lw=1, c='k')
+    axis.axvline(time[include][0], ls='--', lw=1, c='k')
+    axis.axvline(time[include][-1], ls='--', lw=1, c='k')
     axis.plot([], [], label='24-hour period', ls='--', lw=0.5, c='k')
 
     axis.set_title('Pressure divided by Temperature\n(displayed over selected analysis period)')
@@ -98,11 +184,12 @@ def plot_pressure_over_temperature(axis, data, results):
 
 def plot_pressure_and_temperature(axis, data, results):
 
-    axis.plot(data.time[data.include], data.pressure[data.include], label='system pressure', lw=1)
+    time, include = data.time.to_numpy(), include_index(data)
+    plot_line(axis, time[include], data['pressure'].to_numpy()[include], label='system pressure', lw=1)
     axis.plot([], [], label='system temperature', lw=1, c='C3')
 
-    axis.axvline(data.time[data.include].iloc[0], ls='--', lw=1, c='k')
-    axis.axvline(data.time[data.include].iloc[-1], ls='--', lw=1, c='k')
+    axis.axvline(time[include][0], ls='--', lw=1, c='k')
+    axis.axvline(time[include][-1], ls='--', lw=1, c='k')
     axis.plot([], [], label='24-hour period', ls='--', lw=0.5, c='k')
 
     plot_period_lines(axis, data)
@@ -112,7 +199,7 @@ def plot_pressure_and_temperature(axis, data, results):
     axis.set_xlabel('Time [hours]')
 
     twin_axis = axis.twinx()
-    twin_axis.plot(data.time[data.include], data.temperature[data.include], lw=1, c='C3')
+    plot_line(twin_axis, time[include], data['temperature'].to_numpy()[include], lw=1, c='C3')
     twin_axis.set_ylabel('Temperature [°C]')
 
     handles, labels = axis.get_legend_handles_labels()
@@ -123,13 +210,14 @@ def plot_pressure_and_temperature(axis, data, results):
 
 def plot_mass(axis, data, results):
 
+    time, include = data.time.to_numpy(), include_index(data)
     trendline_label = f"mass trendline: {trendline_formula(results['trendline_parameters_mass'])}"
 
-    axis.plot(data.time[data.include], data.mass[data.include], label='system mass', lw=1)
-    axis.plot(data.time[data.include], data['trendline_mass'][data.include], label=trendline_label, ls='--', lw=3)
+    plot_line(axis, time[include], data['mass'].to_numpy()[include], label='system mass', lw=1)
+    plot_line(axis, time[include], data['trendline_mass'].to_numpy()[include], label=trendline_label, ls='--', lw=3)
 
-    axis.axvline(data.time[data.include].iloc[0], ls='--', lw=1, c='k')
-    axis.axvline(data.time[data.include].iloc[-1], ls='--', lw=1, c='k')
+    axis.axvline(time[include][0], ls='--', lw=1, c='k')
+    axis.axvline(time[include][-1], ls='--', lw=1, c='k')
     axis.plot([], [], label='24-hour period', ls='--', lw=0.5, c='k')
 
     plot_period_lines(axis, data)
@@ -140,16 +228,63 @@ def plot_mass(axis, data, results):
     axis.legend(frameon=True)
 
 
+def plot_period_rates(axis, data, results):
+
+    period_results = results.get('period_results') or []
+    periods = np.array([period['period'] for period in period_results])
+
+    for offset, method, label in [(-0.1, 'mass_rate', 'leak rate (mass-density)'),
+                                  (0.1, 'ideal_gas_rate', 'leak rate (ideal gas law)')]:
+        axis.errorbar(periods + offset, [period[method] for period in period_results],
+                      yerr=[period[method + '_ci'] for period in period_results], fmt='o', capsize=4, label=label)
+
+    axis.axhline(results['mass_rate'], ls='--', lw=1, c='C0', label='leak rate over the analysis period')
+    axis.axhline(0, lw=0.5, c='k')
+
+    axis.set_xticks(periods)
+    axis.set_title('Leak Rate per 24-hour Period\n(error bars display the 95% confidence interval)')
+    axis.set_ylabel('Leak rate [grams/year]')
+    axis.set_xlabel('Period')
+    axis.legend(frameon=True)
+
+
 def plot_period_lines(axis, data, full_range=False):
 
-    for line in data.time[abs(data.count_period.diff()) > 0]:
+    time = data.time.to_numpy()
+
+    for line in time[1:][np.diff(data.count_period.to_numpy()) != 0]:
 
         if full_range:
-            line -= data.time.iloc[0]
+            line -= time[0]
 
         axis.axvline(line, ls='--', lw=0.5, c='k')
 
 
+def plot_line(axis, x, y, **kwargs):
+
+    n_buckets = int(axis.get_window_extent().width) + 1
+    axis.plot(*decimate(np.asarray(x, dtype=float), np.asarray(y, dtype=float), n_buckets), **kwargs)
+
+
+def decimate(x, y, n_buckets):
+
+    # keeps the first minimum and maximum of every pixel column, which draws the same line at that resolution
+    if len(x) <= 4*n_buckets or x[-1] <= x[0] or not np.isfinite(y).all():
+        return x, y
+
+    bucket = np.minimum(((x - x[0]) / (x[-1] - x[0]) * n_buckets).astype(int), n_buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    counts = np.diff(np.r_[starts, len(x)])
+
+    index = np.arange(len(x))
+    first_min = np.minimum.reduceat(np.where(y == np.repeat(np.minimum.reduceat(y, starts), counts), index, len(x)), starts)
+    first_max = np.minimum.reduceat(np.where(y == np.repeat(np.maximum.reduceat(y, starts), counts), index, len(x)), starts)
+
+    keep = np.unique(np.r_[0, first_min, first_max, len(x) - 1])
+
+    return x[keep], y[keep]
+
+
 def trendline_formula(results):
 
     base, exp = f'{results[0]:.2e}'.split('e')
@@ -0,0 +1,144 @@
+import numpy as np
+from utils.metrics import instrument
+
+# columns served by /data, a bucket keeps the minimum, maximum and mean of its rows so a spike survives any zoom level
+pyramid_columns = ['P/T', 'trendline_P/T', 'pressure', 'temperature', 'mass', 'trendline_mass']
+statistics = ['min', 'max', 'mean']
+default_statistics = ['mean']  # the minimum and maximum (the envelope of a spike) are sent on request
+base_rows = 16  # rows per bucket of the finest level, a range of fewer rows per point is aggregated on request
+level_factor = 4  # buckets of a level merged into one bucket of the next level
+default_points = 100  # a first response of a few kB, a chart asks for its own width
+max_points = 2000
+significant_digits = 8  # of the largest value of a column in a response
+
+
+@instrument('build_pyramid')
+def build_pyramid(data):
+
+    values = {name: data[name].to_numpy(dtype=float) for name in ['time', 'include'] + pyramid_columns if name in data}
+
+    # every level is merged from the one below it, so the whole pyramid takes about one pass over the rows
+    levels = []
+    level = {name: merge(row_statistics(column), base_rows) for name, column in values.items()}
+    bucket_rows = base_rows
+
+    while True:
+        levels.append({'bucket_rows': bucket_rows, **level})
+
+        if len(level['time']['mean']) <= 1:
+            break
+
+        level = {name: merge(stats, level_factor) for name, stats in level.items()}
+        bucket_rows *= level_factor
+
+    size = sum(array.nbytes for level in levels for name in values for array in level[name].values())
+
+    return {'rows': len(data), 'columns': [name for name in pyramid_columns if name in values], 'levels': levels,
+            'periods': period_boundaries(values['time'], data.count_period.to_numpy()), 'bytes': size}
+
+
+@instrument('level_of_detail')
+def level_of_detail(pyramid, data, start=None, end=None, points=default_points, columns=None, stats=None):
+
+    columns = columns or pyramid['columns']
+    stats = stats or default_statistics
+    unknown = [name for name in columns if name not in pyramid['columns']]
+
+    if unknown:
+        raise ValueError(f"column {', '.join(unknown)} not in list of available columns")
+    if any(stat not in statistics for stat in stats):
+        raise ValueError('statistic not in list of available statistics')
+    if not 1 <= points <= max_points:
+        raise ValueError(f'points must be between 1 and {max_points}')
+
+    # the row range from the stored time column, a binary search only touches a few pages of it
+    time = data.time.to_numpy()
+    first = 0 if start is None else int(np.searchsorted(time, start, 'left'))
+    last = len(time) if end is None else int(np.searchsorted(time, end, 'right'))
+    rows = max(last - first, 0)
+    bucket_rows = max(-(-rows // points), 1)
+
+    # the coarsest level still finer than asked for, its buckets in the range are merged down to the requested points.
+    # the rows themselves for a short range, read from the stored data
+    if bucket_rows < base_rows:
+        source = {name: row_statistics(data[name].to_numpy(dtype=float)[first:last])
+                  for name in ['time', 'include'] + columns}
+        source_rows = 1
+    else:
+        level = [level for level in pyramid['levels'] if level['bucket_rows'] <= bucket_rows][-1]
+        source_rows = level['bucket_rows']
+        buckets = slice(first // source_rows, -(-last // source_rows))
+        source = {name: {stat: array[buckets] for stat, array in level[name].items()}
+                  for name in ['time', 'include'] + columns}
+
+    factor = max(-(-len(source['time']['mean']) // points), 1)
+    level = {name: merge(stats, factor) for name, stats in source.items()}
+    bucket_rows = source_rows * factor
+
+    # only the mean of a bucket of a single row and of a trendline, which is straight within any bucket
+    def sent(name):
+        return ['mean'] if bucket_rows == 1 or name.startswith('trendline_') else [stat for stat in statistics
+                                                                                   if stat in stats]
+
+    start = float(time[first]) if rows else start
+    end = float(time[last - 1]) if rows else end
+
+    return {
+        'start': start,
+        'end': end,
+        'rows': rows,
+        'bucket_rows': bucket_rows,
+        'time': listed(level['time']['mean']),
+        'include': listed(level['include']['mean'], 3),
+        'columns': {name: {stat: listed(level[name][stat]) for stat in sent(name)} for name in columns},
+        'periods': [period for period in pyramid['periods']
+                    if rows and period['end_time'] >= start and period['start_time'] <= end]
+    }
+
+
+def row_statistics(values):
+    return {'min': values, 'max': values, 'mean': values, 'count': np.isfinite(values).astype(np.int64)}
+
+
+def merge(stats, factor):
+
+    # the last bucket is padded with empty rows, which neither the minimum, maximum nor mean count
+    def buckets(values, fill):
+        padded = np.full(-(-len(values) // factor) * factor, fill, dtype=values.dtype)
+        padded[:len(values)] = values
+        return padded.reshape(-1, factor)
+
+    count = buckets(stats['count'], 0).sum(axis=1)
+    total = buckets(np.where(stats['count'] > 0, stats['mean'] * stats['count'], 0), 0).sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+
+    return {'min': np.fmin.reduce(buckets(stats['min'], np.nan), axis=1),
+            'max': np.fmax.reduce(buckets(stats['max'], np.nan), axis=1),
+            'mean': mean, 'count': count}
+
+
+def period_boundaries(time, count_period):
+
+    rows = np.flatnonzero(count_period > 0)
+
+    if not len(rows):
+        return []
+
+    changes = np.diff(count_period[rows]) != 0
+    starts = rows[np.r_[True, changes]]
+    ends = rows[np.r_[changes, True]]
+
+    return [{'period': int(count_period[start]), 'start_time': start_time, 'end_time': end_time}
+            for start, start_time, end_time in zip(starts, listed(time[starts]), listed(time[ends]))]
+
+
+def listed(values, digits=significant_digits):
+
+    # rounded to significant digits of the largest value instead of the 17 of a float, nan as null
+    finite = np.abs(values[np.isfinite(values)])
+    scale = finite.max() if len(finite) else 0
+    decimals = digits - 1 - int(np.floor(np.log10(scale))) if scale > 0 else 0
+
+    return [None if value != value else value for value in np.round(values, decimals).tolist()]
@@ -0,0 +1,43 @@
+import importlib
+from utils.plot import figure_class
+from utils.export import get_template
+
+# slow to import and only needed by some requests, so imported on first use unless warmed up
+lazy_modules = ['matplotlib.figure', 'docx', 'openpyxl', 'CoolProp.CoolProp']
+
+_lock_files = []
+
+
+def warm_up():
+
+    for module in lazy_modules:
+        importlib.import_module(module)
+
+    figure_class()
+
+    try:
+        get_template()
+    except FileNotFoundError:
+        pass
+
+
+def acquire_lock(path):
+
+    # the lock is held until the process exits, a lock of a process that died is released by the OS,
+    # forked processes share it with the process that took it
+    try:
+        import fcntl
+    except ImportError:
+        return True
+
+    file = open(path, 'a')
+
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return False
+
+    _lock_files.append(file)
+
+    return True
@@ -0,0 +1,98 @@
+import os
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+from utils.metrics import instrument
+
+magic = b'PDTSTORE'
+alignment = 64  # bytes, every column starts on a cache line so it can be mapped without copying
+
+
+@instrument('save_session')
+def save_session(directory, data, parameters, results):
+
+    arrays = []
+    columns = []
+    offset = 0
+
+    for name in data.columns:
+        array = np.ascontiguousarray(data[name].to_numpy())
+
+        if array.dtype == object:
+            raise TypeError(f'column {name} has no fixed size data type and cannot be stored')
+
+        arrays.append(array)
+        columns.append({'name': name, 'dtype': array.dtype.str, 'offset': offset, 'length': len(array)})
+        offset += aligned(array.nbytes)
+
+    header = json.dumps({'columns': columns, 'parameters': parameters, 'results': results}).encode()
+    data_start = aligned(len(magic) + 8 + len(header))
+
+    # written under a temporary name and renamed once complete, so a reader never sees a partly written file
+    with tempfile.NamedTemporaryFile(delete=False, dir=directory, mode='wb', prefix='session_',
+                                     suffix='.store.part') as file:
+        try:
+            file.write(magic)
+            file.write(len(header).to_bytes(8, 'little'))
+            file.write(header)
+
+            for column, array in zip(columns, arrays):
+                file.seek(data_start + column['offset'])
+                file.write(array.view(np.uint8).data)
+
+            file.truncate(data_start + offset)
+        except Exception:
+            file.close()
+            os.remove(file.name)
+            raise
+
+    path = file.name[:-len('.part')]
+    os.replace(file.name, path)
+
+    return path
+
+
+def load_session(path):
+
+    with open(path, 'rb') as file:
+        header, _ = read_header(file)
+
+    return header['parameters'], header['results']
+
+
+@instrument('load_data')
+def load_data(path, columns=None):
+
+    with open(path, 'rb') as file:
+        header, data_start = read_header(file)
+
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    data = {}
+
+    for column in header['columns']:
+        if columns is not None and column['name'] not in columns:
+            continue
+
+        dtype = np.dtype(column['dtype'])
+        start = data_start + column['offset']
+        array = buffer[start:start + column['length']*dtype.itemsize].view(dtype)
+
+        data[column['name']] = pd.Series(array, copy=False)
+
+    return pd.DataFrame(data, copy=False)
+
+
+def read_header(file):
+
+    if file.read(len(magic)) != magic:
+        raise ValueError('file is not a session data store')
+
+    size = int.from_bytes(file.read(8), 'little')
+    header = json.loads(file.read(size))
+
+    return header, aligned(len(magic) + 8 + size)
+
+
+def aligned(size):
+    return -(-size // alignment) * alignment
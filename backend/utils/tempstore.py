@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+# files written to a temporary name first, they only get their final name once complete
+partial_suffixes = ('.part', '.tmp')
+# file name patterns the kind of a file found on disk (after a restart) is recognized by
+kind_patterns = [('figure', 'figure_', None), ('upload', 'upload_', None), ('profile', 'profile_', None),
+                 ('session', None, '.store')]
+eviction_reasons = ['expired', 'quota', 'session', 'removed']
+
+
+class TempStore:
+
+    def __init__(self, directory, max_bytes, ttls, keep=()):
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = ttls  # seconds since the last access per kind, 'other' for files of an unknown kind
+        self.keep = set(keep)  # file names that are never removed
+
+        # path: {'kind', 'owner', 'size', 'accessed', 'readers', 'pinned', 'removed'}, least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+        self.evictions = {reason: 0 for reason in eviction_reasons}
+        self.lock = threading.Lock()
+
+    def add(self, path, kind, owner=None, pinned=False):
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(path, None)
+            if previous and not previous['removed']:
+                self.size -= previous['size']
+
+            self.entries[path] = {'kind': kind, 'owner': owner, 'size': size, 'accessed': time.time(), 'readers': 0,
+                                  'pinned': pinned, 'removed': False}
+            self.size += size
+
+            removed = self.evict_quota(path)
+
+        remove_files(removed)
+
+    def assign(self, path, owner):
+
+        with self.lock:
+            if path in self.entries:
+                self.entries[path]['owner'] = owner
+
+    @contextmanager
+    def reading(self, path):
+
+        # files written by another worker process or a previous run are only known on disk, they are taken over once
+        # read here and until then left to the sweep, not to the quota of this process
+        if path not in self.entries and os.path.isfile(path):
+            self.add(path, file_kind(os.path.basename(path)))
+
+        # a file being read is neither evicted nor removed, a removal meanwhile happens once the last reader is done
+        with self.lock:
+            entry = self.entries.get(path)
+
+            if entry is None or entry['removed']:
+                raise FileNotFoundError(f'{os.path.basename(path)} has expired or has been removed')
+
+            entry['readers'] += 1
+            entry['accessed'] = time.time()
+            self.entries.move_to_end(path)
+
+        # the modification time tells other worker processes, which only know the file on disk, it is still in use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        try:
+            yield path
+        finally:
+            with self.lock:
+                entry['readers'] -= 1
+                removed = []
+
+                if entry['removed'] and not entry['readers']:
+                    removed.append(path)
+                    if self.entries.get(path) is entry:
+                        del self.entries[path]
+
+            remove_files(removed)
+
+    def remove(self, path, reason='removed'):
+
+        with self.lock:
+            removed = self.discard([path], reason)
+
+        remove_files(removed)
+
+    def remove_owner(self, owner, reason='session'):
+
+        with self.lock:
+            removed = self.discard([path for path, entry in self.entries.items() if entry['owner'] == owner], reason)
+
+        remove_files(removed)
+
+    def discard(self, paths, reason):
+
+        # entries are dropped right away, the files of entries that are being read are removed by their last reader
+        removed = []
+
+        for path in paths:
+            entry = self.entries.get(path)
+
+            if entry is None or entry['removed']:
+                continue
+
+            entry['removed'] = True
+            self.size -= entry['size']
+            self.evictions[reason] += 1
+
+            if not entry['readers']:
+                del self.entries[path]
+                removed.append(path)
+
+        return removed
+
+    def evict_quota(self, added):
+
+        # the file just added is kept even on its own over the quota, it is about to be used
+        paths = []
+        size = self.size
+
+        for path, entry in self.entries.items():
+            if size <= self.max_bytes:
+                break
+
+            if path != added and not entry['readers'] and not entry['pinned'] and not entry['removed']:
+                paths.append(path)
+                size -= entry['size']
+
+        return self.discard(paths, 'quota')
+
+    def cleanup(self, sweep=True):
+
+        now = time.time()
+
+        with self.lock:
+            # a read by another worker process only shows in the modification time
+            for path, entry in self.entries.items():
+                if not entry['removed']:
+                    entry['accessed'] = max(entry['accessed'], mtime(self.directory, os.path.basename(path)))
+
+            # the files of a session expire together, from the last access to any one of them
+            owners = {}
+            for entry in self.entries.values():
+                if entry['owner'] is not None:
+                    owners[entry['owner']] = max(owners.get(entry['owner'], 0), entry['accessed'])
+
+            expired = [path for path, entry in self.entries.items()
+                       if not entry['readers'] and not entry['pinned'] and not entry['removed']
+                       and now - owners.get(entry['owner'], entry['accessed']) > self.ttls[entry['kind']]]
+            removed = self.discard(expired, 'expired')
+            tracked = set(self.entries)
+
+        remove_files(removed)
+
+        if not sweep:
+            return
+
+        # leftovers of writes that never finished and files this process did not register, of another worker process
+        # or a previous run, by their modification time
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+
+            if path in tracked or filename in self.keep:
+                continue
+
+            ttl = 3600 if filename.endswith(partial_suffixes) else self.ttls[file_kind(filename)]
+
+            try:
+                if now - os.path.getmtime(path) > ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def stats(self):
+
+        with self.lock:
+            kinds = {}
+            for entry in self.entries.values():
+                if not entry['removed']:
+                    files, size = kinds.get(entry['kind'], (0, 0))
+                    kinds[entry['kind']] = (files + 1, size + entry['size'])
+
+            return {'bytes': self.size, 'max_bytes': self.max_bytes, 'kinds': kinds, 'evictions': dict(self.evictions)}
+
+
+def file_kind(filename):
+
+    for kind, prefix, suffix in kind_patterns:
+        if (prefix is None or filename.startswith(prefix)) and (suffix is None or filename.endswith(suffix)):
+            return kind
+
+    return 'other'
+
+
+def mtime(directory, filename):
+
+    try:
+        return os.path.getmtime(os.path.join(directory, filename))
+    except OSError:
+        return 0
+
+
+def remove_files(paths):
+
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
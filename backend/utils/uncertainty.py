@@ -0,0 +1,115 @@
+import os
+import numpy as np
+from utils.density import compute_density
+from utils.metrics import instrument
+
+UNCERTAINTY_DRAWS = int(os.getenv('UNCERTAINTY_DRAWS', 2000))
+
+# stated sensor accuracy, taken as the 95 % bound of a normally distributed error
+default_accuracy = {
+    'pressure': 0.1,  # % of reading
+    'temperature': 0.5,  # K
+    'volume': 2  # % of the given volume or mass
+}
+batch_size = 250  # draws evaluated at once, a batch of a month of 1-minute data takes ~90 MB
+percentiles = [2.5, 50, 97.5]
+seed = 0  # the same draws for every analysis, so a repeated analysis reports the same interval
+min_draws = 100  # finite draws below which the interval is reported as unavailable
+
+# steps of the finite difference density derivatives
+step_temperature = 0.01  # K
+step_pressure = 1e-4  # relative
+
+
+@instrument('uncertainty')
+def uncertainty_analysis(data, parameters, volume, weights=None, include=None):
+
+    # every draw is a systematic error of the pressure (gain) and temperature (offset) sensors and of the volume,
+    # the readings themselves are not redrawn as their noise is already in the measured data
+    include = data.include.to_numpy() if include is None else include
+    time = data.time.to_numpy()[include]
+    pressure = data.pressure.to_numpy()[include]
+    temperature = data.temperature.to_numpy()[include]
+    density = data.density.to_numpy()[include]
+
+    rng = np.random.default_rng(seed)
+    draws = {name: rng.normal(0, parameters[f'accuracy_{name}'] / 1.96, UNCERTAINTY_DRAWS)
+             for name in default_accuracy}
+    gain_pressure = 1 + draws['pressure'] / 100
+    offset_temperature = draws['temperature']
+    volumes = volume * (1 + draws['volume'] / 100)
+
+    # density is linearized around every reading instead of evaluated per draw, the errors are small against the
+    # scale density curves on. At 4 sigma errors the slopes are within 0.002 % of an exact evaluation per draw for a
+    # gas at 5-10 bar, 0.02 % for CO2 at 30 bar and 0.5 % for CO2 at 45 bar, close to condensing
+    medium = parameters['medium']
+    derivative_temperature = density_derivative(temperature, pressure, density, medium, step_temperature=step_temperature)
+    derivative_pressure = density_derivative(temperature, pressure, density, medium, step_pressure=step_pressure)
+
+    # the slope of a least squares line is linear in y, so the slopes of a batch of draws are one matrix product,
+    # a robust fit is taken with the weights of the measured data
+    weights = weights or {}
+    coefficients_mass = slope_coefficients(time, weights.get('mass'))
+    coefficients_pressure = slope_coefficients(time, weights.get('P/T'))
+
+    slopes_mass, slopes_pressure, mean_density = [], [], []
+
+    for start in range(0, UNCERTAINTY_DRAWS, batch_size):
+        batch = slice(start, start + batch_size)
+
+        batch_density = (density + derivative_temperature * offset_temperature[batch, None]
+                         + derivative_pressure * (gain_pressure[batch, None] - 1))
+        batch_pressure = (pressure * gain_pressure[batch, None]) / (temperature + offset_temperature[batch, None] + 273.15)
+
+        slopes_mass.append(batch_density @ coefficients_mass * volumes[batch])
+        slopes_pressure.append(batch_pressure @ coefficients_pressure)
+        mean_density.append(batch_density.mean(axis=1))
+
+    slopes_mass = np.concatenate(slopes_mass)
+    slopes_pressure = np.concatenate(slopes_pressure)
+    mean_density = np.concatenate(mean_density)
+
+    # the rates of the draws, with the same conversions as the results themselves
+    mass_rate = -slopes_mass * 24 * 365.25 * 1000
+    ideal_gas_rate = -slopes_pressure * 100000 * volumes * 44.009 * 24 * 365.25 / 8.3145
+    bubble_rate = -np.sign(slopes_mass) * (np.abs(slopes_mass) * 6 / 3600 / np.pi / mean_density)**(1/3) * 1000
+
+    # a reading without a density derivative either way spoils every draw, the interval is then left out of the
+    # results instead of failing the analysis
+    finite = np.isfinite(mass_rate) & np.isfinite(ideal_gas_rate) & np.isfinite(bubble_rate)
+
+    if finite.sum() < min_draws:
+        return None
+
+    mass_rate, ideal_gas_rate, bubble_rate = mass_rate[finite], ideal_gas_rate[finite], bubble_rate[finite]
+
+    return {
+        'draws': int(finite.sum()),
+        'percentiles': percentiles,
+        'mass_rate': [round(value) for value in np.percentile(mass_rate, percentiles)],
+        'ideal_gas_rate': [round(value) for value in np.percentile(ideal_gas_rate, percentiles)],
+        'bubble_rate': [round(value, 1) for value in np.percentile(bubble_rate, percentiles)]
+    }
+
+
+def density_derivative(temperature, pressure, density, medium, step_temperature=0.0, step_pressure=0.0):
+
+    # forward difference, backward where the step forward leaves the range CoolProp evaluates (saturation, a table edge)
+    step = step_temperature or step_pressure
+    derivative = (compute_density(temperature + step_temperature, pressure * (1 + step_pressure), medium) - density) / step
+    missing = ~np.isfinite(derivative)
+
+    if missing.any():
+        backward = compute_density(temperature[missing] - step_temperature, pressure[missing] * (1 - step_pressure), medium)
+        derivative[missing] = (density[missing] - backward) / step
+
+    return derivative
+
+
+def slope_coefficients(x, weights=None):
+
+    # slope = sum(coefficients * y) for the (weighted) least squares line through (x, y)
+    weights = np.ones(len(x)) if weights is None else weights
+    dx = x - np.sum(weights * x) / np.sum(weights)
+
+    return weights * dx / np.sum(weights * dx * dx)
@@ -1,5 +1,15 @@
+import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from utils.analysis import (RESAMPLE_PERIOD, resample_periods, resample_gaps, trendline_methods, bucket_rows,
+                            bucket_totals, resampled_frame)
+from utils.metrics import instrument
+from utils.dates import parse_date_format
+from utils.uncertainty import default_accuracy
+
+STREAMING_THRESHOLD = int(os.getenv('STREAMING_THRESHOLD', 50 * 1024**2))  # bytes, larger uploads are streamed
+chunk_size = 500000  # rows per chunk when streaming
 
 
 def parameter_validation(parameters):
@@ -37,24 +47,57 @@ def parameter_validation(parameters):
 
     parameters['periodic_limit_off'] = 'periodic_limit_off' in parameters
 
+    parameters['trendline_method'] = parameters.get('trendline_method') or 'least_squares'
+
+    if parameters['trendline_method'] not in trendline_methods:
+        raise ValueError('trendline method not in list of available methods')
+
+    parameters['resample_period'] = parameters.get('resample_period') or RESAMPLE_PERIOD
+
+    if parameters['resample_period'] not in resample_periods:
+        raise ValueError('resampling period not in list of available periods')
+
+    parameters['resample_gaps'] = parameters.get('resample_gaps') or 'drop'
+
+    if parameters['resample_gaps'] not in resample_gaps:
+        raise ValueError('gap handling not in list of available methods')
+
+    # the form only sends the checkbox when it is ticked, a JSON parameters file (batch) may send it as false
+    parameters['uncertainty'] = bool(parameters.get('uncertainty'))
+
+    # an accuracy of 0 (a number in a JSON parameters file) is kept, only a missing or empty field takes the default
+    for name, default in default_accuracy.items():
+        accuracy = parameters.get(f'accuracy_{name}')
+        parameters[f'accuracy_{name}'] = float(default if accuracy is None or accuracy == '' else accuracy)
+
+        if parameters[f'accuracy_{name}'] < 0:
+            raise ValueError(f'{name} accuracy cannot be negative')
+
     return parameters
 
 
+@instrument('file_validation')
 def file_validation(file, parameters):
 
-    data = read_file(file)
+    if file_size(file) > STREAMING_THRESHOLD:
+        return stream_file(file, parameters)
 
-    n_rows, n_cols = data.shape
-    column_indices = [parameters['col_date'] - 1, parameters['col_pressure'] - 1, parameters['col_temperature'] - 1]
+    if check_file(file) == 'xlsx':
+        data = read_excel_columns(file, parameters)
+    else:
+        data = read_file(file)
 
-    if max(column_indices) > n_cols:
-        raise ValueError('column number must not exceed total available columns in data file')
+        n_rows, n_cols = data.shape
+        column_indices = [parameters['col_date'] - 1, parameters['col_pressure'] - 1, parameters['col_temperature'] - 1]
 
-    if parameters['start_row'] > n_rows + 1:
-        raise ValueError('header row must not exceed total available rows in data file')
+        if max(column_indices) > n_cols:
+            raise ValueError('column number must not exceed total available columns in data file')
+
+        if parameters['start_row'] > n_rows + 1:
+            raise ValueError('header row must not exceed total available rows in data file')
 
-    data = data.iloc[parameters['start_row'] - 1:, column_indices].reset_index(drop=True)
-    data.columns = ['date', 'pressure', 'temperature']
+        data = data.iloc[parameters['start_row'] - 1:, column_indices].reset_index(drop=True)
+        data.columns = ['date', 'pressure', 'temperature']
 
     data.date = parse_date_format(data.date, parameters['format_date'], parameters['custom_format'])
 
@@ -70,23 +113,157 @@ def file_validation(file, parameters):
     return data
 
 
-def read_file(file):
+@instrument('stream_file')
+def stream_file(file, parameters):
 
-    allowed_file_formats = {
-        'csv': ['text/csv', 'application/vnd.ms-excel'],
-        'xls': ['application/vnd.ms-excel'],
-        'xlsx': ['application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']
-    }
+    extension = check_file(file)
+    column_indices = [parameters['col_date'] - 1, parameters['col_pressure'] - 1, parameters['col_temperature'] - 1]
+
+    if extension == 'xlsx':
+        chunks = [read_excel_columns(file, parameters).set_axis(column_indices, axis=1)]
+    else:
+        chunks = read_chunks(file, extension, parameters['start_row'], column_indices)
+
+    keys, totals = [], []
+    first_date, last_date = None, None
+
+    for chunk in chunks:
+
+        data = chunk[column_indices]
+        data.columns = ['date', 'pressure', 'temperature']
+
+        data.date = parse_date_format(data.date, parameters['format_date'], parameters['custom_format'])
+
+        try:
+            data.pressure = data.pressure.astype('float')
+            data.temperature = data.temperature.astype('float')
+        except Exception:
+            raise ValueError('the selected pressure and/or temperature column does not exclusively contain numerical data')
+
+        if len(data) == 0:
+            continue
+
+        if first_date is None:
+            first_date = data.date.iloc[0]
+        last_date = data.date.iloc[-1]
+
+        # the sums and counts of every bucket of the chunk, a bucket split over two chunks is added up below
+        chunk_keys, chunk_totals = bucket_rows(data.date, data.pressure.to_numpy(), data.temperature.to_numpy(),
+                                               parameters['resample_period'])
+        keys.append(chunk_keys)
+        totals.append(chunk_totals)
+
+    if first_date is None:
+        raise ValueError('header row must not exceed total available rows in data file')
+
+    if first_date >= last_date:
+        raise ValueError('end time in the data file must be later than the start time')
+
+    keys, totals = bucket_totals(np.concatenate(keys), np.hstack(totals))
+    data = resampled_frame(keys, totals, parameters['resample_period'], parameters['resample_gaps'])
+    data.attrs['date_range'] = (first_date, last_date)
+
+    return data
+
+
+def read_chunks(file, extension, start_row, column_indices):
+
+    # a csv is parsed lazily, a column out of range may only show with the first chunk instead of at read_csv
+    try:
+        if extension == 'csv':
+            yield from pd.read_csv(file, header=None, skiprows=start_row, usecols=column_indices, chunksize=chunk_size)
+        elif extension == 'xls':
+            yield pd.read_excel(file, header=None, skiprows=start_row, usecols=column_indices)
+    except pd.errors.EmptyDataError:
+        # nothing left to parse below the header row
+        raise ValueError('header row must not exceed total available rows in data file')
+    except ValueError as e:
+        # any other parser error (an undecodable file) is reported as it is
+        if 'usecols' not in str(e).lower():
+            raise
+        raise ValueError('column number must not exceed total available columns in data file')
+
+
+def file_size(file):
 
     if not file or file.filename == '':
-        raise FileNotFoundError('no file has been uploaded')
+        return 0
 
-    extension = file.filename.rsplit('.')[-1].lower()
-    mimetype = file.mimetype
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
 
-    if extension not in allowed_file_formats and mimetype not in allowed_file_formats[extension]:
-        raise ValueError(f'uploaded file type not allowed, only the following file types are accepted:'
-                         f' {allowed_file_formats.keys}')
+    return size
+
+
+@instrument('read_excel_columns')
+def read_excel_columns(file, parameters):
+
+    # streams the rows of the first sheet and keeps only the three selected cells of every row,
+    # instead of building a frame of every cell first (.xlsx only, openpyxl cannot read .xls)
+    import openpyxl
+    workbook = openpyxl.load_workbook(file.stream, read_only=True, data_only=True)
+
+    try:
+        sheet = workbook.worksheets[0]
+        columns = [parameters['col_date'], parameters['col_pressure'], parameters['col_temperature']]
+
+        # the sheet dimension is only a hint for the size of the arrays, it is often wrong (a file that claims to be a
+        # single cell reads as empty), so the rows are read without it and the errors come from the rows found
+        size = max(sheet.max_row - parameters['start_row'], 1) if sheet.max_row else chunk_size
+        sheet.reset_dimensions()
+
+        dates = np.empty(size, dtype=object)
+        values = np.full((size, 2), np.nan)
+
+        first_column = min(columns)
+        offsets = [column - first_column for column in columns]
+        last_row = 0
+        width = 0  # columns from the first selected one to the last cell of the widest row, header rows included
+
+        for number, row in enumerate(sheet.iter_rows(min_col=first_column, values_only=True)):
+            width = max(width, len(row))
+            i = number - parameters['start_row']
+
+            if i < 0:
+                continue
+
+            if i == len(dates):
+                dates = np.resize(dates, 2*len(dates))
+                values = np.resize(values, (2*len(values), 2))
+                values[i:] = np.nan
+
+            date, pressure, temperature = (row[offset] if offset < len(row) else None for offset in offsets)
+            dates[i] = date
+
+            try:
+                values[i] = (np.nan if pressure is None else pressure, np.nan if temperature is None else temperature)
+            except (ValueError, TypeError):
+                raise ValueError('the selected pressure and/or temperature column does not exclusively contain '
+                                 'numerical data')
+
+            if date is not None or pressure is not None or temperature is not None:
+                last_row = i + 1
+    finally:
+        workbook.close()
+
+    if width and max(offsets) >= width:
+        raise ValueError('column number must not exceed total available columns in data file')
+
+    if last_row == 0:
+        raise ValueError('header row must not exceed total available rows in data file')
+
+    # trailing empty rows are dropped, as pandas does
+    data = pd.DataFrame({'date': pd.Series(dates[:last_row]).infer_objects(), 'pressure': values[:last_row, 0],
+                         'temperature': values[:last_row, 1]})
+
+    return data
+
+
+@instrument('read_file')
+def read_file(file):
+
+    extension = check_file(file)
 
     if extension == 'csv':
         data = pd.read_csv(file)
@@ -96,26 +273,22 @@ def read_file(file):
     return data
 
 
-def parse_date_format(date_series, format_type, custom_format=None):
+def check_file(file):
 
-    date_formats = {
-        'simex': ("%d/%m/%Y %H:%M:%S", None),
-        'scada': ("%Y/%m/%d %H:%M:%S.%f", None),
-        'xls': (None, 's'),
-        'unix': (None, 's'),
-        'custom': (custom_format, None)
+    allowed_file_formats = {
+        'csv': ['text/csv', 'application/vnd.ms-excel'],
+        'xls': ['application/vnd.ms-excel'],
+        'xlsx': ['application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']
     }
 
-    if format_type == 'xls':
-        date_series = date_series.apply(lambda t: 86400 * t - 2209161600)
+    if not file or file.filename == '':
+        raise FileNotFoundError('no file has been uploaded')
+
+    extension = file.filename.rsplit('.')[-1].lower()
+    mimetype = file.mimetype
 
-    if format_type in date_formats:
-        try:
-            return pd.to_datetime(date_series, format=date_formats[format_type][0], unit=date_formats[format_type][1])
-        except Exception:
-            try:
-                return pd.to_datetime(date_series)
-            except Exception:
-                raise ValueError(f'{format_type.upper()} date format of file could not be parsed')
-    else:
-        raise ValueError('date format not in list of available formats')
+    if extension not in allowed_file_formats and mimetype not in allowed_file_formats[extension]:
+        raise ValueError(f'uploaded file type not allowed, only the following file types are accepted:'
+                         f' {allowed_file_formats.keys}')
+
+    return extension